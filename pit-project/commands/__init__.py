@@ -1,23 +1,3 @@
 # This file makes the 'commands' directory a Python package
-# Importing command modules from here
-
-from . import init
-from . import add
-from . import commit
-from . import log
-from . import status
-from . import config
-from . import branch
-from . import checkout
-from . import diff
-from . import merge
-from . import reset
-from . import revert
-from . import clean
-from . import mergetool
-from . import difftool
-# from . import remote
-# from . import push
-# from . import pull
-# from . import clone
-from . import stash
+# Command modules are not imported here: `from commands import status` (or importlib) loads just the one needed,
+# so running a single command doesn't import every other command and its dependencies
@@ -20,47 +20,59 @@ def run(args):
     index_path = os.path.join(repo_root, '.pit', 'index')
     ignore_patterns = ignore.get_ignored_patterns(repo_root) # Load ignore patterns from .pitgnore
     
-    # Read the current index using centralized function
-    index = index_utils.read_index(repo_root)
-
     files_to_add = _expand_files(args, repo_root)
 
-    for file_path in files_to_add:
+    rel_paths = [os.path.relpath(file_path, repo_root) for file_path in files_to_add]
+    ignored = ignore.filter_ignored(rel_paths, ignore_patterns) # Match every candidate in one batch
+    
+    # Pick out the files to stage; each is stat'ed before it is hashed, so a later write shows up as a stale mtime
+    to_hash = []
+    for file_path, rel_path in zip(files_to_add, rel_paths):
         if not os.path.exists(file_path):
             print(f"fatal: pathspec '{file_path}' did not match any files", file=sys.stderr)
             continue
         
-        rel_path = os.path.relpath(file_path, repo_root)
-        
         # Check if the file should be ignored
-        if ignore.is_ignored(rel_path, ignore_patterns):
+        if rel_path in ignored:
             continue
 
         if not os.path.isfile(file_path):
             continue
-            
+        
         try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-            
-            # Get metadata
-            stats = os.stat(file_path)
-            mtime = stats.st_mtime_ns
-            size = stats.st_size
+            to_hash.append((file_path, rel_path, os.stat(file_path)))
+        except OSError as e:
+            print(f"Error adding file {file_path}: {e}", file=sys.stderr)
+
+    # A file whose mtime is not older than the index's own may have changed after its entry was recorded ("racy"), so it is always rehashed
+    try:
+        index_mtime = os.stat(index_path).st_mtime_ns
+    except OSError:
+        index_mtime = 0
 
-            # Create a blob object and get its hash
-            hash_val = objects.hash_object(repo_root, content, 'blob')
+    # One index read and one write, however many files are added; blobs are hashed and stored on a thread pool
+    with index_utils.IndexSession(repo_root) as session:
+        # Stat cache: a staged file whose mtime and size still match its index entry keeps that hash and is not read again
+        known = {}
+        for _, rel_path, stats in to_hash:
+            entry = session.index.get(rel_path)
+            if entry is not None and entry[1] == stats.st_mtime_ns and entry[2] == stats.st_size and stats.st_mtime_ns < index_mtime:
+                known[rel_path] = entry[0]
+        
+        results = iter(objects.hash_many(repo_root, [file_path for file_path, rel_path, _ in to_hash if rel_path not in known]))
+        for file_path, rel_path, stats in to_hash:
+            if rel_path in known:
+                hash_val, error = known[rel_path], None
+            else:
+                _, hash_val, error = next(results)
+            if error is not None:
+                print(f"Error adding file {file_path}: {error}", file=sys.stderr)
+                continue
             
             # Update the index
-            index[rel_path] = (hash_val, mtime, size)
+            session.set(rel_path, hash_val, stats.st_mtime_ns, stats.st_size)
             print(f"Added '{rel_path}' to the index.")
 
-        except Exception as e:
-            print(f"Error adding file {file_path}: {e}", file=sys.stderr)
-
-    # Write the updated index back using centralized function
-    index_utils.write_index(repo_root, index)
-
 # Expands file arguments like '.' into a list of all files in the directory.
 def _expand_files(args, repo_root):
     expanded_files = []
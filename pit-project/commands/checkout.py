@@ -13,7 +13,7 @@
 import sys
 import os
 import shutil
-from utils import repository, objects, ignore, index as index_utils
+from utils import repository, objects, ignore, worktree, index as index_utils
 
 def run(args):
     repo_root = repository.find_repo_root()
@@ -87,13 +87,10 @@ def perform_checkout(repo_root, target_branch):
     # We use the current committed state as the baseline for swapping.
     current_files = objects.get_commit_files(repo_root, current_commit_hash) if current_commit_hash else {}
 
-    # 3. Apply tree swap (Update Working Directory)
-    update_working_directory(repo_root, current_files, target_files)
+    # 3. Apply tree swap (Update Working Directory and rewrite Index in one pass)
+    apply_tree(repo_root, current_files, target_files)
     
-    # 4. Rewrite Index
-    update_index(repo_root, target_files)
-    
-    # 5. Update HEAD
+    # 4. Update HEAD
     head_path = os.path.join(repo_root, '.pit', 'HEAD')
     ref_path = f"ref: refs/heads/{target_branch}"
     with open(head_path, 'w') as f:
@@ -108,7 +105,9 @@ def is_clean(repo_root):
     head_commit = repository.get_head_commit(repo_root)
     head_files = objects.get_commit_files(repo_root, head_commit) if head_commit else {}
     
-    index_files = load_index(repo_root)
+    racy_mtime = index_utils.index_mtime(repo_root) # Stat data is only trusted for files older than the index itself
+    index_full = index_utils.read_index(repo_root) # Full entries: the stat data lets unchanged files skip hashing
+    index_files = {path: data[0] for path, data in index_full.items()}
     
     # Compare keys and hashes
     if head_files != index_files:
@@ -117,33 +116,19 @@ def is_clean(repo_root):
     # 2. Index vs Working Dir
     # We need to scan working dir
     ignore_patterns = ignore.get_ignored_patterns(repo_root)
-    for root, dirs, files in os.walk(repo_root):
-        if '.pit' in dirs:
-            dirs.remove('.pit')
+    for rel_path, entry in worktree.iter_working_files(repo_root, ignore_patterns):
+        # Untracked files are ignored by checkout unless they would be overwritten;
+        # "If any tracked file differs, stop..." (from requirements technical detail)
+        idx_entry = index_full.get(rel_path)
+        if idx_entry is None:
+            continue
         
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, repo_root)
-            
-            if ignore.is_ignored(rel_path, ignore_patterns):
-                continue
-                
-            # If file in working dir but not in index -> Untracked (Dirty?)
-            # Usually untracked files are ignored by checkout unless they would be overwritten.
-            # But requirement says "Validate that no uncommitted or unstaged changes exist".
-            # This usually refers to tracked files.
-            # "If any tracked file differs, stop..." (from requirements technical detail)
-            
-            if rel_path in index_files:
-                # Check contents
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                current_hash = objects.hash_object(repo_root, content, 'blob', write=False)
-                if current_hash != index_files[rel_path]:
-                    return False # Modified tracked file
-            
-            # If unsaved/untracked file exists and TARGET has a file with same name, we should error.
-            # But the requirement "If any tracked file differs" implies we focus on tracked changes.
+        # Stat cache: matching mtime and size on a non-racy entry means the file still holds the indexed content, so it isn't opened
+        stats = entry.stat()
+        if idx_entry[1] == stats.st_mtime_ns and idx_entry[2] == stats.st_size and stats.st_mtime_ns < racy_mtime:
+            continue
+        if objects.hash_file(entry.path) != idx_entry[0]:
+            return False # Modified tracked file
     
     # Also check if files in index are missing from working dir
     for rel_path in index_files:
@@ -157,39 +142,6 @@ def load_index(repo_root):
     # Use centralized index function
     return index_utils.read_index_hashes(repo_root)
 
-def update_working_directory(repo_root, current_files, target_files):
-    # Calculate diff
-    # Files to delete: in current but not in target
-    files_to_delete = set(current_files.keys()) - set(target_files.keys())
-    
-    # Files to create/update: in target
-    for rel_path, params_hash in target_files.items():
-        full_path = os.path.join(repo_root, rel_path)
-        
-        should_write = False
-        if rel_path not in current_files:
-            should_write = True # New file
-        elif current_files[rel_path] != params_hash:
-            should_write = True # Changed file
-            
-        if should_write:
-            obj_type, content = objects.read_object(repo_root, params_hash)
-            if obj_type != 'blob':
-                print(f"warning: skipped non-blob object {rel_path}", file=sys.stderr)
-                continue
-            
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, 'wb') as f:
-                f.write(content)
-                
-    # Delete files
-    for rel_path in files_to_delete:
-        full_path = os.path.join(repo_root, rel_path)
-        if os.path.exists(full_path):
-            os.remove(full_path)
-            # Potentially remove empty dirs
-            cleanup_empty_dirs(repo_root, os.path.dirname(full_path))
-            
 def cleanup_empty_dirs(repo_root, dir_path):
     if dir_path == repo_root or not dir_path.startswith(repo_root):
         return
@@ -199,9 +151,34 @@ def cleanup_empty_dirs(repo_root, dir_path):
     except OSError:
         pass
 
-def update_index(repo_root, target_files):
-    # Use centralized index function with 0 for mtime/size (forces refresh)
-    index_utils.write_index(repo_root, target_files)
+def apply_tree(repo_root, current_files, target_files):
+    # One pass over both trees updates the working directory and builds the new index
+    new_index = {}
+    # Deletions sort first so a removed file never blocks a directory the target needs at the same path
+    for rel_path in sorted(current_files.keys() | target_files.keys(), key=lambda p: p in target_files):
+        full_path = os.path.join(repo_root, rel_path)
+        target_hash = target_files.get(rel_path)
+        
+        if target_hash is None:
+            # In current but not in target -> delete
+            if os.path.exists(full_path):
+                os.remove(full_path)
+                cleanup_empty_dirs(repo_root, os.path.dirname(full_path))
+            continue
+        
+        new_index[rel_path] = (target_hash, 0, 0) # 0 for mtime/size (forces refresh)
+        if current_files.get(rel_path) == target_hash:
+            continue # Unchanged
+        
+        obj_type, content = objects.read_object(repo_root, target_hash)
+        if obj_type != 'blob':
+            print(f"warning: skipped non-blob object {rel_path}", file=sys.stderr)
+            continue
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(content)
+    
+    index_utils.write_index(repo_root, new_index)
 
 def handle_file_restore(repo_root, targets):
     # Existing file checkout logic (Refactored)
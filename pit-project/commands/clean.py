@@ -22,7 +22,7 @@ def run(args): #Starts the workspace cleanup process
         norm_path = os.path.normpath(path)
         index_files.add(os.path.normcase(norm_path))
 
-    ignore_patterns = ignore.get_ignored_patterns(repo_root) 
+    ignore_patterns = ignore.compile_patterns(ignore.get_ignored_patterns(repo_root)) # Compiled once, not looked up per file
     
     tracked_dirs = set() # Tracking parent directories of all indexed files
     for f in index_files:
@@ -56,17 +56,15 @@ def run(args): #Starts the workspace cleanup process
                     untracked_dirs.append(d_rel_path)
                     dirs.remove(d)
 
-        for f in files: # Identifying untracked files
-            f_rel_path = os.path.normpath(os.path.join(rel_root, f)).lstrip(os.sep)
-            if f_rel_path == '.':
-                f_rel_path = ""
-            
-            norm_f_path = os.path.normcase(f_rel_path)
-            # Add to clean list if not tracked and not ignored
-            if norm_f_path not in index_files and not ignore.is_ignored(f_rel_path, ignore_patterns):
+        # Identifying untracked files: one set difference against the index per directory, then only those are matched against .pitignore
+        rel_files = {os.path.normcase(f_rel_path): f_rel_path for f_rel_path in (os.path.join(rel_root, f) if rel_root else f for f in files)}
+        for norm_f_path in rel_files.keys() - index_files:
+            f_rel_path = rel_files[norm_f_path]
+            if not ignore.is_ignored(f_rel_path, ignore_patterns):
                 untracked_files.append(f_rel_path)
 
     items_to_clean = sorted(untracked_files + untracked_dirs)
+    untracked_dirs = set(untracked_dirs) # Only membership tests from here on
 
     if not items_to_clean: # Exit if everything is already clean
         return
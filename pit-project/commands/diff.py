@@ -61,7 +61,7 @@ def _get_working_dir_files(repo_root, index_files=None):
         index_files = {}
         
     working_files = {}
-    ignore_patterns = ignore.get_ignored_patterns(repo_root)
+    ignore_patterns = ignore.compile_patterns(ignore.get_ignored_patterns(repo_root)) # Compiled once, not looked up per file
     for root, dirs, files in os.walk(repo_root):
         if '.pit' in dirs:
             dirs.remove('.pit')
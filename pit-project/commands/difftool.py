@@ -19,7 +19,7 @@ def run(args):
         
     # Get Tool Configuration
     cfg = config.read_config()
-    tool_command = cfg.get('diff', 'tool', fallback='code --wait --diff $LOCAL $REMOTE')
+    tool_command = cfg.get('diff', {}).get('tool', 'code --wait --diff $LOCAL $REMOTE')
     
     # Reuse diff logic to find changes
     if args.staged:
@@ -5,6 +5,7 @@
 
 import sys
 import os
+from utils import repository
 def run(args):
 
     try:
@@ -28,6 +29,7 @@ def run(args):
         master_branch_path = os.path.join(repo_path, 'refs', 'heads', 'master')
         open(master_branch_path, 'w').close()
             
+        repository.invalidate_repo_root_cache() # A repo nested inside another must now win over the outer root
         print(f"Initialized empty Pit repository in {repo_path}/")
 
     except Exception as e:
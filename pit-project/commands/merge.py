@@ -129,16 +129,14 @@ def _get_commit_parents(repo_root, commit_hash):
 def _perform_three_way_merge(repo_root, ancestor_hash, head_hash, merge_hash):
     
     # Get file states from all three commits
-    ancestor_files = objects.get_commit_files(repo_root, ancestor_hash)
-    head_files = objects.get_commit_files(repo_root, head_hash)
-    merge_files = objects.get_commit_files(repo_root, merge_hash)
+    # Memoized per commit: when rebase replays a chain, this commit's ancestor is the previous one's merge side
+    ancestor_files = objects.get_commit_tree_map(repo_root, ancestor_hash)
+    head_files = objects.get_commit_tree_map(repo_root, head_hash)
+    merge_files = objects.get_commit_tree_map(repo_root, merge_hash)
     
     all_files = set(ancestor_files.keys()) | set(head_files.keys()) | set(merge_files.keys())
     conflicts = []
     
-    # Read current index using centralized function
-    current_index = index_utils.read_index_hashes(repo_root)
-    
     # Write MERGE_HEAD for mergetool context
     merge_head_path = os.path.join(repo_root, '.pit', 'MERGE_HEAD')
     with open(merge_head_path, 'w') as f:
@@ -175,9 +173,7 @@ def _perform_three_way_merge(repo_root, ancestor_hash, head_hash, merge_hash):
     if os.path.exists(merge_head_path):
         os.remove(merge_head_path)
 
-    # Write the merged index using centralized function
-    index_utils.write_index(repo_root, current_index)
-    
+    # The index was already updated file by file by _stage_file_version/_remove_file
     return True
 
 # Merge a single file using three-way merge algorithm
@@ -6,6 +6,9 @@
 
 import sys
 import os
+import re
+import argparse
+import shlex
 import shutil
 import subprocess
 import tempfile
@@ -13,6 +16,11 @@ import platform
 from utils import repository, objects, config
 from commands import merge, add
 
+# One alternation over all three markers so a file is scanned once instead of once per marker
+_CONFLICT_MARKER_RE = re.compile(rb'<<<<<<< HEAD|=======|>>>>>>>')
+_CONFLICT_MARKERS = (b'<<<<<<< HEAD', b'=======', b'>>>>>>>')
+_MIN_CONFLICT_SIZE = sum(len(marker) for marker in _CONFLICT_MARKERS)
+
 def run(args):
     repo_root = repository.find_repo_root()
     if not repo_root:
@@ -41,35 +49,63 @@ def run(args):
     
     # 3. Get Tool Configuration
     cfg = config.read_config()
-    tool_command = cfg.get('merge', 'tool', fallback='code --wait --merge $LOCAL $REMOTE $BASE $MERGED')
+    tool_command = cfg.get('merge', {}).get('tool', 'code --wait --merge $LOCAL $REMOTE $BASE $MERGED')
     
     print(f"Merging {len(conflicted_files)} files using '{tool_command}'")
+
+    # The three trees are the same for every conflicted file, so read them once
+    base_files = objects.get_commit_files(repo_root, base_commit)
+    head_files = objects.get_commit_files(repo_root, head_commit)
+    remote_files = objects.get_commit_files(repo_root, remote_commit)
     
     for file_path in conflicted_files:
         print(f"Merging {file_path}...")
-        _process_file(repo_root, file_path, base_commit, head_commit, remote_commit, tool_command)
+        _process_file(repo_root, file_path, base_files, head_files, remote_files, tool_command)
 
 def _find_conflicted_files(repo_root):
     conflicts = []
-    for root, _, files in os.walk(repo_root):
-        if '.pit' in root: continue
-        for file in files:
-            full_path = os.path.join(root, file)
-            try:
-                with open(full_path, 'rb') as f:
-                    content = f.read()
-                    if b'<<<<<<< HEAD' in content and b'=======' in content and b'>>>>>>>' in content:
-                         conflicts.append(os.path.relpath(full_path, repo_root))
-            except:
-                pass 
+    for full_path in _iter_candidate_files(repo_root):
+        try:
+            with open(full_path, 'rb') as f:
+                content = f.read()
+                if _has_conflict_markers(content):
+                     conflicts.append(os.path.relpath(full_path, repo_root))
+        except:
+            pass 
     return conflicts
 
-def _process_file(repo_root, file_path, base_commit, head_commit, remote_commit, tool_command):
+# Depth-first scandir walk that skips .pit before descending and files too small to hold all three markers
+def _iter_candidate_files(repo_root):
+    stack = [repo_root]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != '.pit':
+                            stack.append(entry.path)
+                    elif entry.is_file() and entry.stat().st_size >= _MIN_CONFLICT_SIZE:
+                        yield entry.path
+                except OSError:
+                    continue
+
+# Returns True if the markers appear in order (HEAD, separator, end), checked in a single pass
+def _has_conflict_markers(content):
+    stage = 0
+    for match in _CONFLICT_MARKER_RE.finditer(content):
+        if match.group() == _CONFLICT_MARKERS[stage]:
+            stage += 1
+            if stage == len(_CONFLICT_MARKERS):
+                return True
+    return False
+
+def _process_file(repo_root, file_path, base_files, head_files, remote_files, tool_command):
     # Extract versions
-    base_files = objects.get_commit_files(repo_root, base_commit)
-    head_files = objects.get_commit_files(repo_root, head_commit)
-    remote_files = objects.get_commit_files(repo_root, remote_commit)
-    
     base_hash = base_files.get(file_path)
     head_hash = head_files.get(file_path)
     remote_hash = remote_files.get(file_path)
@@ -84,38 +120,60 @@ def _process_file(repo_root, file_path, base_commit, head_commit, remote_commit,
         os.close(fd)
         return path
 
-    local_tmp = write_temp(head_hash, "LOCAL")
-    remote_tmp = write_temp(remote_hash, "REMOTE")
-    base_tmp = write_temp(base_hash, "BASE")
+    # Only materialize the sides the configured tool actually references
+    def temp_for(placeholder, hash_val):
+        return write_temp(hash_val, placeholder) if f'${placeholder}' in tool_command else None
+
+    local_tmp = temp_for("LOCAL", head_hash)
+    remote_tmp = temp_for("REMOTE", remote_hash)
+    base_tmp = temp_for("BASE", base_hash)
     merged_path = os.path.join(repo_root, file_path) # In-place edit
     
     # Prepare command with cross-platform null device
     null_path = "NUL" if platform.system() == "Windows" else "/dev/null"
-    cmd = tool_command
-    cmd = cmd.replace('$LOCAL', local_tmp or null_path)
-    cmd = cmd.replace('$REMOTE', remote_tmp or null_path)
-    cmd = cmd.replace('$BASE', base_tmp or null_path)
-    cmd = cmd.replace('$MERGED', merged_path)
+    substitutions = {
+        '$LOCAL': local_tmp or null_path,
+        '$REMOTE': remote_tmp or null_path,
+        '$BASE': base_tmp or null_path,
+        '$MERGED': merged_path,
+    }
+    cmd = _build_argv(tool_command, substitutions)
     
     # Run
     try:
-        subprocess.check_call(cmd, shell=True)
+        subprocess.check_call(cmd)
         # Check if markers still exist (simple check)
         with open(merged_path, 'rb') as f:
-            if b'<<<<<<< HEAD' not in f.read():
+            if not _has_conflict_markers(f.read()):
                 # Conflict resolved?
-                # Autostage
+                # Autostage in-process instead of spawning another interpreter for `pit add`
                 try:
-                    subprocess.check_call([sys.executable, sys.argv[0], 'add', file_path])
+                    add.run(argparse.Namespace(files=[merged_path], all=False))
                     print(f"{file_path} merged and staged.")
-                except subprocess.CalledProcessError:
+                except SystemExit:
                     print(f"Failed to stage {file_path}")
             else:
                 print(f"Warning: {file_path} still contains conflict markers.")
-    except subprocess.CalledProcessError:
+    except (subprocess.CalledProcessError, OSError):
         print(f"Merge tool failed for {file_path}")
     finally:
         # Cleanup
         for p in [local_tmp, remote_tmp, base_tmp]:
             if p and os.path.exists(p):
                 os.remove(p)
+
+# Splits the tool command into argv and fills in the placeholders per argument, so no shell is spawned
+# and paths containing spaces stay a single argument
+def _build_argv(tool_command, substitutions):
+    posix = os.name != 'nt'
+    argv = []
+    for arg in shlex.split(tool_command, posix=posix):
+        if not posix and len(arg) >= 2 and arg[0] == arg[-1] == '"':
+            arg = arg[1:-1]
+        for placeholder, value in substitutions.items():
+            arg = arg.replace(placeholder, value)
+        argv.append(arg)
+    # Resolve the executable so wrappers like code.cmd are found on Windows without a shell
+    if argv:
+        argv[0] = shutil.which(argv[0]) or argv[0]
+    return argv
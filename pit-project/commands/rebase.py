@@ -1,11 +1,32 @@
 import sys
 import os
 import shutil
+from array import array
+from collections import deque, namedtuple
+from functools import lru_cache
 from utils import repository, objects, config
 from commands import merge, commit, checkout
 
 REBASE_DIR = 'rebase-apply'
 
+# Parsed commit objects keyed by hash: {hash: {tree, parents, parent, message}}
+_COMMIT_CACHE = {}
+
+# State file locations for one repository, joined once instead of on every helper call
+RebasePaths = namedtuple('RebasePaths', 'dir commits next head_name orig_head head')
+
+@lru_cache(maxsize=None)
+def _rebase_paths(repo_root):
+    rebase_dir = os.path.join(repo_root, '.pit', REBASE_DIR)
+    return RebasePaths(
+        dir=rebase_dir,
+        commits=os.path.join(rebase_dir, 'commits'),
+        next=os.path.join(rebase_dir, 'next'),
+        head_name=os.path.join(rebase_dir, 'head-name'),
+        orig_head=os.path.join(rebase_dir, 'orig-head'),
+        head=os.path.join(repo_root, '.pit', 'HEAD'),
+    )
+
 def run(args):
     repo_root = repository.find_repo_root()
     if not repo_root:
@@ -54,10 +75,16 @@ def _start_rebase(repo_root, upstream_name):
         print("fatal: no commits yet", file=sys.stderr)
         sys.exit(1)
 
-    if current_branch == upstream_name:
+    if current_branch == upstream_name or head_commit == upstream_commit:
         print(f"Current branch {current_branch} is up to date.", file=sys.stderr)
         sys.exit(0)
 
+    # Fast-forward: HEAD is an ancestor of upstream, so there is nothing to replay
+    if _is_ancestor(repo_root, head_commit, upstream_commit):
+        _fast_forward(repo_root, current_branch, head_commit, upstream_commit)
+        print(f"Fast-forwarded {current_branch} to {upstream_name}.")
+        return
+
     # 2. Collect Commits (Set Difference)
     commits_to_replay = _collect_commits_to_replay(repo_root, head_commit, upstream_commit)
     
@@ -72,11 +99,10 @@ def _start_rebase(repo_root, upstream_name):
     _save_rebase_state(repo_root, current_branch, commits_to_replay)
 
     # Hard reset logic (update files + index)
-    upstream_files = objects.get_commit_files(repo_root, upstream_commit)
-    current_files = objects.get_commit_files(repo_root, head_commit)
+    upstream_files = objects.get_commit_tree_map(repo_root, upstream_commit)
+    current_files = objects.get_commit_tree_map(repo_root, head_commit)
     
-    checkout.update_working_directory(repo_root, current_files, upstream_files)
-    checkout.update_index(repo_root, upstream_files)
+    checkout.apply_tree(repo_root, current_files, upstream_files)
     
     # Detach HEAD: Write the hash directly to .pit/HEAD
     _write_detached_head(repo_root, upstream_commit)
@@ -85,9 +111,19 @@ def _start_rebase(repo_root, upstream_name):
     _replay_loop(repo_root)
 
 
+def _fast_forward(repo_root, branch_name, head_commit, upstream_commit):
+    # Move the branch straight to upstream: no state dir, no replay loop, no three-way merges
+    current_files = objects.get_commit_tree_map(repo_root, head_commit)
+    upstream_files = objects.get_commit_tree_map(repo_root, upstream_commit)
+
+    checkout.apply_tree(repo_root, current_files, upstream_files)
+
+    branch_ref_path = os.path.join(repo_root, '.pit', 'refs', 'heads', branch_name)
+    repository.atomic_write(branch_ref_path, f"{upstream_commit}\n")
+
+
 def _handle_continue(repo_root):
-    rebase_dir = os.path.join(repo_root, '.pit', REBASE_DIR)
-    if not os.path.exists(rebase_dir):
+    if not os.path.exists(_rebase_paths(repo_root).dir):
         print("fatal: No rebase in progress?", file=sys.stderr)
         sys.exit(1)
 
@@ -117,26 +153,28 @@ def _handle_continue(repo_root):
 
 
 def _handle_abort(repo_root):
-    rebase_dir = os.path.join(repo_root, '.pit', REBASE_DIR)
+    paths = _rebase_paths(repo_root)
+    rebase_dir = paths.dir
     if not os.path.exists(rebase_dir):
         print("fatal: No rebase in progress?", file=sys.stderr)
         sys.exit(1)
         
     # Read original head
-    orig_head_path = os.path.join(rebase_dir, 'orig-head')
-    orig_branch_path = os.path.join(rebase_dir, 'head-name')
+    orig_head_path = paths.orig_head
+    orig_branch_path = paths.head_name
     
     if os.path.exists(orig_head_path):
         with open(orig_head_path, 'r') as f:
             orig_hash = f.read().strip()
         
         # Hard reset to orig_hash
+        # If HEAD was never moved off orig_hash, diffing the tree against itself would change nothing: skip the tree I/O
         current_head = repository.get_head_commit(repo_root)
-        current_files = objects.get_commit_files(repo_root, current_head) if current_head else {}
-        target_files = objects.get_commit_files(repo_root, orig_hash)
-        
-        checkout.update_working_directory(repo_root, current_files, target_files)
-        checkout.update_index(repo_root, target_files)
+        if current_head != orig_hash:
+            current_files = objects.get_commit_tree_map(repo_root, current_head) if current_head else {}
+            target_files = objects.get_commit_tree_map(repo_root, orig_hash)
+            
+            checkout.apply_tree(repo_root, current_files, target_files)
         
         # Restore HEAD ref
         if os.path.exists(orig_branch_path):
@@ -144,22 +182,22 @@ def _handle_abort(repo_root):
                 branch_name = f.read().strip()
             
             # Point HEAD back to branch
-            head_path = os.path.join(repo_root, '.pit', 'HEAD')
-            with open(head_path, 'w') as f:
-                f.write(f"ref: refs/heads/{branch_name}\n")
+            repository.atomic_write(paths.head, f"ref: refs/heads/{branch_name}\n")
         else:
             # Detached
             _write_detached_head(repo_root, orig_hash)
             
     print("Rebase aborted.")
     shutil.rmtree(rebase_dir)
+    _COMMIT_CACHE.clear()
 
 
 def _replay_loop(repo_root):
+    # Nothing else touches the state file mid-loop, so read it once and walk the list in memory
     commits = _load_remaining_commits(repo_root)
+    next_index = _read_next_index(repo_root)
     
-    while commits:
-        commit_hash = commits[0]
+    for commit_hash in commits:
         commit_data = _get_commit_data(repo_root, commit_hash)
         msg_title = commit_data['message'].splitlines()[0]
         print(f"Applying: {msg_title}")
@@ -185,16 +223,17 @@ def _replay_loop(repo_root):
         commit.create_commit(repo_root, commit_data['message'], parents)
         
         # Remove from state
-        _pop_commit_from_state(repo_root)
-        commits = _load_remaining_commits(repo_root)
+        next_index += 1
+        _write_next_index(repo_root, next_index)
         
     _finish_rebase(repo_root)
 
 
 def _finish_rebase(repo_root):
     # Move original branch ref to current HEAD
-    rebase_dir = os.path.join(repo_root, '.pit', REBASE_DIR)
-    branch_name_path = os.path.join(rebase_dir, 'head-name')
+    paths = _rebase_paths(repo_root)
+    rebase_dir = paths.dir
+    branch_name_path = paths.head_name
     
     if os.path.exists(branch_name_path):
         with open(branch_name_path, 'r') as f:
@@ -204,167 +243,225 @@ def _finish_rebase(repo_root):
         
         # Update branch ref
         branch_ref_path = os.path.join(repo_root, '.pit', 'refs', 'heads', branch_name)
-        with open(branch_ref_path, 'w') as f:
-            f.write(f"{current_head}\n")
+        repository.atomic_write(branch_ref_path, f"{current_head}\n")
             
         # Re-attach HEAD
-        head_path = os.path.join(repo_root, '.pit', 'HEAD')
-        with open(head_path, 'w') as f:
-            f.write(f"ref: refs/heads/{branch_name}\n")
+        repository.atomic_write(paths.head, f"ref: refs/heads/{branch_name}\n")
             
         print(f"Successfully rebased {branch_name} to {current_head[:7]}.")
     
     if os.path.exists(rebase_dir):
         shutil.rmtree(rebase_dir)
+    _COMMIT_CACHE.clear()
 
 
 def _collect_commits_to_replay(repo_root, head, upstream):
-    # 1. Reachable from HEAD (Set A)
-    head_reachable = _get_reachable_commits(repo_root, head)
-    # 2. Reachable from Upstream (Set B)
-    upstream_reachable = _get_reachable_commits(repo_root, upstream)
+    if head == upstream:
+        return []
+    
+    # Common case: HEAD is a straight line of commits on top of upstream, so follow it down and stop there
+    chain = _linear_chain_to(repo_root, head, upstream)
+    if chain is not None:
+        return chain
+    
+    # 1. Commits reachable from HEAD but not from upstream (A - B), found in one shared walk
+    to_replay_set, parents_map = _walk_symmetric(repo_root, head, upstream)
     
-    # 3. Difference (A - B) -> Commits unique to feature branch
-    to_replay_set = head_reachable - upstream_reachable
+    # Filter out merge commits (linearize history) using the parents recorded by the walk,
+    # so they never enter the sort's adjacency and in-degree maps
+    linear_set = {c for c in to_replay_set if len(parents_map[c]) <= 1}
     
-    if not to_replay_set:
+    if not linear_set:
         return []
         
-    # 4. Topological Sort (Kahn's Algorithm)
+    # 2. Topological Sort (Kahn's Algorithm)
     # We want to order them such that parents come before children.
     # In topological sort terms, if A is parent of B, A -> B dependency.
-    
-    # Filter out merge commits (linearize history)
-    linear_set = set()
-    for c in to_replay_set:
-        if len(_get_parents(repo_root, c)) <= 1:
-            linear_set.add(c)
-            
-    return _topological_sort(repo_root, linear_set)
-
-def _get_reachable_commits(repo_root, start_commit):
-    from collections import deque
-    if not start_commit:
-        return set()
+    return _topological_sort(linear_set, parents_map)
+
+# Walks head's and upstream's single-parent chains in lockstep, so it stops at their merge base instead of the root:
+# the first commit one side reaches that the other has already passed. Returns head's commits above it, oldest-first.
+# A side stops at a merge commit or a root; if both stop before meeting, the histories aren't two simple lines and it returns None
+def _linear_chain_to(repo_root, head, upstream):
+    chain = [] # Head's side, newest first
+    head_seen, upstream_seen = set(), set()
+    curr, upstream_curr = head, upstream
+    while curr is not None or upstream_curr is not None:
+        if curr is not None:
+            if curr in upstream_seen:
+                base = curr
+                break
+            chain.append(curr)
+            head_seen.add(curr)
+            parents = _get_parents(repo_root, curr)
+            curr = parents[0] if len(parents) == 1 else None
         
-    reachable = set()
-    queue = deque([start_commit])
+        if upstream_curr is not None:
+            if upstream_curr in head_seen:
+                base = upstream_curr # Head already walked past the base, so its chain is cut back to it below
+                break
+            upstream_seen.add(upstream_curr)
+            parents = _get_parents(repo_root, upstream_curr)
+            upstream_curr = parents[0] if len(parents) == 1 else None
+    else:
+        return None
     
+    if base in head_seen:
+        del chain[chain.index(base):]
+    chain.reverse()
+    return chain
+
+# BFS parent-ward from descendant; True as soon as ancestor is found
+def _is_ancestor(repo_root, ancestor, descendant):
+    visited = {descendant}
+    queue = deque([descendant])
     while queue:
-        curr = queue.popleft() # O(1)
-        if curr in reachable:
-            continue
-        reachable.add(curr)
-        
+        curr = queue.popleft()
+        if curr == ancestor:
+            return True
+        for p in _get_parents(repo_root, curr):
+            if p not in visited:
+                visited.add(p)
+                queue.append(p)
+    return False
+
+# Colors every commit by which side reaches it (1 = HEAD, 2 = upstream, 3 = both) in a single BFS
+# Parents are only revisited when a commit's color changes, so shared history is walked once rather than twice
+# Returns the HEAD-only set along with the parents recorded for every visited commit
+def _walk_symmetric(repo_root, head, upstream):
+    HEAD_SIDE, UPSTREAM_SIDE = 1, 2
+
+    color = {}
+    parents_map = {}
+    queue = deque()
+    if head:
+        queue.append((head, HEAD_SIDE))
+    if upstream:
+        queue.append((upstream, UPSTREAM_SIDE))
+
+    while queue:
+        curr, bits = queue.popleft()
+        old = color.get(curr, 0)
+        new = old | bits
+        if new == old:
+            continue # Nothing new to propagate past this commit
+        color[curr] = new
+
         parents = _get_parents(repo_root, curr)
+        parents_map[curr] = parents
         for p in parents:
-            if p not in reachable:
-                queue.append(p)
-                
-    return reachable
+            if color.get(p, 0) | new != color.get(p, 0):
+                queue.append((p, new))
 
-def _topological_sort(repo_root, commit_set):
-    # Build adjacency list: parent -> [children] (within set)
-    adj = {c: [] for c in commit_set}
-    in_degree = {c: 0 for c in commit_set}
+    return {c for c, bits in color.items() if bits == HEAD_SIDE}, parents_map
+
+def _topological_sort(commit_set, parents_map):
+
+    # Map each hash to an integer once so the sort works on list/array indices instead of string-keyed dicts
+    hashes = list(commit_set)
+    idx = {h: i for i, h in enumerate(hashes)}
     
-    # Populate graph
-    from collections import deque
+    # Build adjacency list: parent -> [children] (within set)
+    adj = [[] for _ in hashes]
+    in_degree = array('i', [0]) * len(hashes)
     
-    for commit in commit_set:
-        parents = _get_parents(repo_root, commit)
-        for p in parents:
-            if p in commit_set:
-                adj[p].append(commit) # p is parent of commit
-                in_degree[commit] += 1
+    # Populate graph from the parents recorded during the reachability walk (no object reads)
+    for i, commit_hash in enumerate(hashes):
+        for p in parents_map[commit_hash]:
+            j = idx.get(p)
+            if j is not None:
+                adj[j].append(i) # p is parent of commit
+                in_degree[i] += 1
                 
     # Queue for Kahn's (commits with 0 in-degree: no parents in set -> oldest)
-    queue = deque([c for c in commit_set if in_degree[c] == 0])
-    sorted_result = []
+    queue = deque(i for i in range(len(hashes)) if in_degree[i] == 0)
+    order = []
     
     while queue:
         node = queue.popleft()
-        sorted_result.append(node)
+        order.append(node)
         
         for child in adj[node]:
             in_degree[child] -= 1
             if in_degree[child] == 0:
                 queue.append(child)
                 
+    sorted_result = [hashes[i] for i in order]
     # If len(sorted_result) != len(commit_set), we have a cycle or issue
     # For Git DAG, cycles shouldn't exist.
     return sorted_result
 
 
 def _save_rebase_state(repo_root, branch_name, commits):
-    rebase_dir = os.path.join(repo_root, '.pit', REBASE_DIR)
-    os.makedirs(rebase_dir, exist_ok=True)
+    paths = _rebase_paths(repo_root)
+    os.makedirs(paths.dir, exist_ok=True)
     
-    with open(os.path.join(rebase_dir, 'head-name'), 'w') as f:
+    with open(paths.head_name, 'w') as f:
         f.write(branch_name)
         
     head_commit = repository.get_head_commit(repo_root)
-    with open(os.path.join(rebase_dir, 'orig-head'), 'w') as f:
+    with open(paths.orig_head, 'w') as f:
         f.write(head_commit)
         
-    with open(os.path.join(rebase_dir, 'commits'), 'w') as f:
-        for c in commits:
-            f.write(f"{c}\n")
+    repository.atomic_write(paths.commits, ''.join(f"{c}\n" for c in commits))
+    _write_next_index(repo_root, 0)
 
 def _load_remaining_commits(repo_root):
-    path = os.path.join(repo_root, '.pit', REBASE_DIR, 'commits')
+    path = _rebase_paths(repo_root).commits
     if not os.path.exists(path):
         return []
     with open(path, 'r') as f:
-        return [l.strip() for l in f.readlines() if l.strip()]
+        commits = [l.strip() for l in f.readlines() if l.strip()]
+    return commits[_read_next_index(repo_root):]
+
+# The commits file is written once; 'next' holds the index of the next commit to apply
+def _read_next_index(repo_root):
+    path = _rebase_paths(repo_root).next
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def _write_next_index(repo_root, index):
+    # Atomic, so an interrupted pop never leaves a torn pointer
+    repository.atomic_write(_rebase_paths(repo_root).next, f"{index}\n")
 
 def _pop_commit_from_state(repo_root):
-    commits = _load_remaining_commits(repo_root)
-    if commits:
-        commits.pop(0)
-        path = os.path.join(repo_root, '.pit', REBASE_DIR, 'commits')
-        with open(path, 'w') as f:
-            for c in commits:
-                f.write(f"{c}\n")
+    _write_next_index(repo_root, _read_next_index(repo_root) + 1)
 
 def _read_next_commit(repo_root):
     commits = _load_remaining_commits(repo_root)
     return commits[0] if commits else None
 
 def _write_detached_head(repo_root, commit_hash):
-    head_path = os.path.join(repo_root, '.pit', 'HEAD')
-    with open(head_path, 'w') as f:
-        f.write(f"{commit_hash}\n")
+    repository.atomic_write(_rebase_paths(repo_root).head, f"{commit_hash}\n")
 
 def _is_valid_commit(repo_root, commit_hash):
     try:
-        obj_type, _ = objects.read_object(repo_root, commit_hash)
-        return obj_type == 'commit'
+        return objects.peek_type(repo_root, commit_hash) == 'commit'
     except Exception:
         return False
 
 def _get_parents(repo_root, commit_hash):
-    obj_type, content = objects.read_object(repo_root, commit_hash)
-    lines = content.decode().splitlines()
-    parents = []
-    for line in lines:
-        if line.startswith('parent '):
-            parents.append(line.split(' ')[1])
-    return parents
+    return _get_commit_data(repo_root, commit_hash)['parents']
 
 def _get_commit_data(repo_root, commit_hash):
+    # Each commit is read and parsed once per rebase; the ancestry walks and the replay loop share the result
+    data = _COMMIT_CACHE.get(commit_hash)
+    if data is not None:
+        return data
+
     obj_type, content = objects.read_object(repo_root, commit_hash)
-    lines = content.decode().splitlines()
-    data = {'hash': commit_hash, 'message': '', 'parent': None}
-    msg_started = False
-    msg_lines = []
-    for line in lines:
-        if line.startswith('parent '):
-            if not data['parent']:
-                data['parent'] = line.split(' ')[1]
-        elif not line.strip() and not msg_started:
-            msg_started = True
-        elif msg_started:
-            msg_lines.append(line)
-    data['message'] = '\n'.join(msg_lines)
+    header, _, message = content.partition(b'\n\n')
+    data = {'hash': commit_hash, 'tree': None, 'parents': [], 'parent': None, 'message': message.decode()}
+    for line in header.split(b'\n'):
+        if line.startswith(b'parent '):
+            data['parents'].append(line[7:].decode('ascii'))
+        elif line.startswith(b'tree '):
+            data['tree'] = line[5:].decode('ascii')
+    if data['parents']:
+        data['parent'] = data['parents'][0]
+
+    _COMMIT_CACHE[commit_hash] = data
     return data
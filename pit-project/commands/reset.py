@@ -1,10 +1,9 @@
 # The command: pit reset <file>
 # What it does: Unstages files by removing them from the staging area (the index). It is the opposite of `pit add`
-# How it does: It uses a "filter and rewrite" strategy. It reads all entries from the current index, filters out the files the user wants to reset, and rewrites the index with the remaining entries
-# What data structure it uses: Dictionary (to hold the index entries that are being kept)
+# How it does: It uses a "filter and rewrite" strategy. It reads the current index, drops the files the user wants to reset, and writes it back with `index_utils.write_index`, which atomically replaces the index
+# What data structure it uses: Dictionary (the index, for O(1) lookups of the paths to reset), List (of the paths found in it, in argument order)
 
 import sys
-import os
 from utils import repository, index as index_utils
 
 def run(args): # Executes the reset command to unstage files
@@ -13,24 +12,16 @@ def run(args): # Executes the reset command to unstage files
         print("fatal: not a pit repository", file=sys.stderr)
         sys.exit(1)
 
-    # Read the current index using centralized function
     index = index_utils.read_index(repo_root)
+    files_reset = [file_path for file_path in dict.fromkeys(args.files) if file_path in index]
+    if not files_reset:
+        return # Nothing staged under those paths, so the index is left untouched
     
-    if not index:
-        return # Nothing to do if there's no index
-    
-    # Filter out files to be reset
-    files_reset = []
-    for file_path in args.files:
-        if file_path in index:
-            del index[file_path]
-            files_reset.append(file_path)
-    
-    # Write updated index using centralized function
+    # Drop the entries being reset; write_index swaps the new index in atomically
+    for file_path in files_reset:
+        del index[file_path]
     index_utils.write_index(repo_root, index)
     
-    if files_reset:
-        print("Unstaged changes after reset:")
-        for file_path in files_reset:
-            print(f" M {file_path}")
-
+    print("Unstaged changes after reset:")
+    for file_path in files_reset:
+        print(f" M {file_path}")
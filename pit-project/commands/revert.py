@@ -8,6 +8,9 @@ import os
 from utils import repository, objects, diff as diff_utils, index as index_utils
 from commands import commit, add
 
+# Parsed commit objects keyed by hash, so each commit is decoded at most once per revert
+_COMMIT_CACHE = {}
+
 def run(args):
     repo_root = repository.find_repo_root()
     if not repo_root:
@@ -51,44 +54,41 @@ def run(args):
 #Check if the given hash corresponds to a valid commit
 def _is_valid_commit(repo_root, commit_hash):
     try:
-        obj_type, _ = objects.read_object(repo_root, commit_hash)
-        return obj_type == 'commit'
+        return objects.peek_type(repo_root, commit_hash) == 'commit'
     except FileNotFoundError:
         return False
     
 #Extract structured data from a commit object
 def _get_commit_data(repo_root, commit_hash):
+    if commit_hash in _COMMIT_CACHE:
+        return _COMMIT_CACHE[commit_hash]
+
     obj_type, content = objects.read_object(repo_root, commit_hash)
     if obj_type != 'commit':
         raise ValueError(f"Object {commit_hash} is not a commit")
     
-    lines = content.decode().splitlines()
+    # Only the small header is scanned line by line; the message is decoded in one go
+    header, _, message = content.partition(b'\n\n')
     commit_data = {
         'hash': commit_hash,
         'tree': None,
         'parent': None,
-        'message': ''
+        'message': '\n'.join(message.decode().splitlines())
     }
     
-    message_started = False
-    message_lines = []
-    
-    for line in lines:
-        if line.startswith('tree '):
-            commit_data['tree'] = line.split(' ')[1]
-        elif line.startswith('parent '):
-            commit_data['parent'] = line.split(' ')[1]
-        elif not line.strip() and not message_started:
-            message_started = True
-        elif message_started:
-            message_lines.append(line)
+    for line in header.decode('utf-8', 'replace').split('\n'):
+        kind, _, value = line.partition(' ')
+        if kind == 'tree':
+            commit_data['tree'] = value
+        elif kind == 'parent':
+            commit_data['parent'] = value
     
-    commit_data['message'] = '\n'.join(message_lines)
+    _COMMIT_CACHE[commit_hash] = commit_data
     return commit_data
 
 def _get_commit_changes(repo_root, parent_commit, target_commit):
-    parent_files = objects.get_commit_files(repo_root, parent_commit['hash']) if parent_commit else {}
-    target_files = objects.get_commit_files(repo_root, target_commit['hash'])
+    parent_files = objects.get_commit_tree_map(repo_root, parent_commit['hash']) if parent_commit else {}
+    target_files = objects.get_commit_tree_map(repo_root, target_commit['hash'])
     
     changes = diff_utils.compare_states(parent_files, target_files)
     return {
@@ -101,8 +101,22 @@ def _get_commit_changes(repo_root, parent_commit, target_commit):
     
 #Apply the reverse of the changes to working directory and staging area
 def _apply_reverse_changes(repo_root, changes):
-    # Read current index using centralized function
-    index_files = index_utils.read_index_hashes(repo_root)
+    # Read current index using centralized function, keeping stat data for entries the revert doesn't touch
+    index_files = index_utils.read_index(repo_root)
+
+    # Blobs shared by several restored paths are decompressed only once
+    blobs = {}
+    def read_blob(blob_hash):
+        if blob_hash not in blobs:
+            blobs[blob_hash] = objects.read_object(repo_root, blob_hash)
+        return blobs[blob_hash]
+
+    # Directories already created during this revert, so restores into the same directory skip the stat
+    ensured_dirs = set()
+    def ensure_dir(dir_path):
+        if dir_path and dir_path not in ensured_dirs:
+            os.makedirs(dir_path, exist_ok=True)
+            ensured_dirs.add(dir_path)
 
     # For files that were added in the original commit-delete them
     for path in changes['added']:
@@ -117,12 +131,10 @@ def _apply_reverse_changes(repo_root, changes):
         if path in changes['parent_files']:
             # Restore the file content from parent commit
             blob_hash = changes['parent_files'][path]
-            obj_type, content = objects.read_object(repo_root, blob_hash)
+            obj_type, content = read_blob(blob_hash)
             if obj_type == 'blob':
                 # Create directory if it doesn't exist
-                dir_path = os.path.dirname(os.path.join(repo_root, path))
-                if dir_path and not os.path.exists(dir_path):
-                    os.makedirs(dir_path, exist_ok=True)
+                ensure_dir(os.path.dirname(os.path.join(repo_root, path)))
                 
                 # Write file content
                 with open(os.path.join(repo_root, path), 'wb') as f:
@@ -135,7 +147,7 @@ def _apply_reverse_changes(repo_root, changes):
     for path in changes['modified']:
         if path in changes['parent_files']:
             blob_hash = changes['parent_files'][path]
-            obj_type, content = objects.read_object(repo_root, blob_hash)
+            obj_type, content = read_blob(blob_hash)
             if obj_type == 'blob':
                 with open(os.path.join(repo_root, path), 'wb') as f:
                     f.write(content)
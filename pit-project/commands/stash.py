@@ -1,12 +1,16 @@
 # The command: pit stash [push|pop|list|clear]
 # What it does: Temporarily stores the current state of the index and working directory to a stash stack, allowing users to switch contexts.
-# How it does: It creates two commit objects: one representing the index state and another representing the working directory state (which points to the index commit as a parent). These commits are stored in a reflog file `.pit/logs/stash`. `reset` is used to revert the workspace after pushing. `pop` restores these states.
+# How it does: It creates two commit objects: one representing the index state and another representing the working directory state (which points to the index commit as a parent). These commits are stored in a reflog file `.pit/logs/stash`. The index and working directory are then reset to HEAD. `pop` restores these states.
 # What data structure it uses: Stack (implemented via the append-only reflog file `.pit/logs/stash`), Trees/Commits (to persist state).
 
 import os
 import sys
 import time
-from utils import repository, objects, config, ignore
+import shutil
+import re
+from utils import repository, objects, config, ignore, worktree, parallel, index as index_utils
+
+_PARENT_RE = re.compile(rb'^parent ([0-9a-f]+)$', re.M) # Every parent line of a commit's headers
 
 def run(args):
     command = args.stash_command
@@ -39,15 +43,78 @@ def push(args):
     # But our commit logic requires parents for non-root.
     # If no HEAD, parent is empty list.
     
+    # Objects written by the push are flushed in one batch and only then moved into the object store
+    objects.begin_odb_transaction(repo_root)
+    try:
+        workdir_commit_hash, msg, head_files, workdir_index = _write_stash_commits(repo_root, args, head_commit)
+    except BaseException:
+        objects.abort_odb_transaction() # A failed write may have left a partial staged file; it must never be renamed under its hash
+        raise
+    objects.end_odb_transaction()
+    
+    # 3. Write to Reflog
+    log_path = _log_path(repo_root)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    # One O_APPEND write of the whole line; O_DSYNC (where available) makes it durable without a separate fsync
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_DSYNC', 0) | getattr(os, 'O_BINARY', 0)
+    fd = os.open(log_path, flags, 0o644)
+    try:
+        os.write(fd, f"{workdir_commit_hash}\n".encode())
+    finally:
+        os.close(fd)
+        
+    print(f"Saved working directory and index state {workdir_commit_hash[:7]}: {msg}")
+    
+    # 4. Reset Workspace to HEAD
+    if head_commit:
+        # 1. Update index to match HEAD
+        # Write head_files to index (0 for mtime/size; one buffered write swapped in atomically)
+        index_utils.write_index(repo_root, head_files)
+        
+        # 2. Update workdir to match HEAD
+        # Restore HEAD files, skipping those whose stashed content already is the HEAD version
+        for path, hash_val in head_files.items():
+            if path in workdir_index and workdir_index[path][0] == hash_val:
+                continue
+            _restore_blob(repo_root, path, hash_val)
+        
+        # Clean up files that were stashed (modified/added) but are not in HEAD
+        # (i.e. revert changes to tracked files, and remove staged new files)
+        # Note: We must NOT delete untracked files that were NOT stashed.
+        
+        # Iterate files in workdir_index (which contains everything we stashed)
+        for path in workdir_index:
+             if path not in head_files:
+                 # It was in the stash, but not in HEAD. It must be a file we added to index.
+                 # Since we are resetting to HEAD, we should remove it.
+                 full_path = os.path.join(repo_root, path)
+                 if os.path.exists(full_path):
+                     os.remove(full_path)
+             # If path IS in head_files, we already overwrote it above with HEAD version.
+
+                     
+    else:
+        # No HEAD. Stash saves everything. Reset means empty?
+        # Remove all tracked-like files?
+        pass
+
+
+def _write_stash_commits(repo_root, args, head_commit): # Writes the index and workdir commits for a push; returns what the reset step needs
     # 1. Create Index Commit (state of the staging area)
+    racy_mtime = index_utils.index_mtime(repo_root) # Stat data is only trusted for files older than the index itself
     index_files = objects.read_index(repo_root)
     # Build tree from index
     tree_dict_idx = objects.build_tree_from_dict(index_files)
-    tree_hash_idx = objects.write_tree(repo_root, tree_dict_idx)
+    # Subtrees the workdir tree shares with the index tree are written once
+    subtree_cache = {}
+    tree_hash_idx = objects.write_tree(repo_root, tree_dict_idx, subtree_cache)
     
     # Create commit object for index
     idx_parents = [head_commit] if head_commit else []
-    index_commit_hash = _create_stash_commit(repo_root, tree_hash_idx, idx_parents, f"index on {repository.get_current_branch(repo_root)}: {head_commit[:7] if head_commit else 'initial'}")
+    # Branch name and identity are read once and shared by both stash commits
+    branch = repository.get_current_branch(repo_root)
+    user = config.get_user_config(repo_root)
+    index_commit_hash = _create_stash_commit(repo_root, tree_hash_idx, idx_parents, f"index on {branch}: {head_commit[:7] if head_commit else 'initial'}", user)
 
     # 2. Create Workdir Commit (state of working directory, including staged and unstaged changes)
     # We need to scan working dir, similar to `add.py`, but not write to index file.
@@ -78,109 +145,76 @@ def push(args):
     staged_files = set(index_files.keys())
     
     ignore_patterns = ignore.get_ignored_patterns(repo_root)
-    for root, dirs, files in os.walk(repo_root):
-        if '.pit' in dirs:
-            dirs.remove('.pit')
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, repo_root)
+    # Ignored directories are pruned by the walker; DirEntry.stat() reuses what the directory scan already fetched
+    to_hash = []
+    seen = set() # Tracked/staged paths the walk found on disk
+    # Bound methods hoisted out of the per-file loop
+    queue_hash, mark_seen, index_get = to_hash.append, seen.add, index_files.get
+    for rel_path, entry in worktree.iter_working_files(repo_root, ignore_patterns):
+        # Skip if not tracked and not staged
+        if rel_path not in tracked_files and rel_path not in staged_files:
+            continue
             
-            if ignore.is_ignored(rel_path, ignore_patterns):
-                continue
-
-            # Skip if not tracked and not staged
-            if rel_path not in tracked_files and rel_path not in staged_files:
-                continue
-                
-            try:
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                
-                stats = os.stat(file_path)
-                mtime = stats.st_mtime_ns
-                size = stats.st_size
-                
-                hash_val = objects.hash_object(repo_root, content, 'blob')
-                workdir_index[rel_path] = (hash_val, mtime, size)
-            except Exception:
-                pass
+        try:
+            stats = entry.stat()
+        except OSError:
+            continue
+        mark_seen(rel_path)
+        mtime = stats.st_mtime_ns
+        size = stats.st_size
+        
+        # Optimization: if mtime and size match a non-racy index entry, reuse its hash (the blob is already stored)
+        idx_entry = index_get(rel_path)
+        if idx_entry is not None and idx_entry[1] == mtime and idx_entry[2] == size and mtime < racy_mtime:
+            workdir_index[rel_path] = (idx_entry[0], mtime, size)
+            continue
+        queue_hash((rel_path, entry.path, mtime, size))
+    
+    # File reads, SHA-1 and zlib all release the GIL, so the remaining files are hashed and written in parallel
+    hash_object = objects.hash_object
+    def store_blob(job):
+        rel_path, file_path, mtime, size = job
+        try:
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            return rel_path, (hash_object(repo_root, content, 'blob'), mtime, size)
+        except Exception:
+            return rel_path, None
     
-    for path in list(workdir_index.keys()):
-        full_path = os.path.join(repo_root, path)
-        if not os.path.exists(full_path):
-            del workdir_index[path]
+    for rel_path, entry_data in parallel.parallel_map(store_blob, to_hash):
+        if entry_data is not None:
+            workdir_index[rel_path] = entry_data
+    
+    # Drop entries deleted from disk in one pass; only paths the walk didn't see need an existence check
+    workdir_index = {path: data for path, data in workdir_index.items()
+                     if path in seen or os.path.exists(os.path.join(repo_root, path))}
 
     tree_dict_wd = objects.build_tree_from_dict(workdir_index)
-    tree_hash_wd = objects.write_tree(repo_root, tree_dict_wd)
+    tree_hash_wd = objects.write_tree(repo_root, tree_dict_wd, subtree_cache)
     
     # Workdir commit parent is HEAD (or empty) AND Index commit
     wd_parents = [head_commit] if head_commit else []
     wd_parents.append(index_commit_hash)
     
     # Message
-    msg = args.message if hasattr(args, 'message') and args.message else f"WIP on {repository.get_current_branch(repo_root)}: {head_commit[:7] if head_commit else 'initial'}"
-    workdir_commit_hash = _create_stash_commit(repo_root, tree_hash_wd, wd_parents, msg)
-    
-    # 3. Write to Reflog
-    log_path = os.path.join(repo_root, '.pit', 'logs', 'stash')
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    with open(log_path, 'a') as f:
-        f.write(f"{workdir_commit_hash}\n")
-        
-    print(f"Saved working directory and index state {workdir_commit_hash[:7]}: {msg}")
-    
-    # 4. Reset Workspace to HEAD
-    if head_commit:
-        from commands import reset, checkout
-        
-        # 1. Update index to match HEAD
-        # Write head_files to index
-        index_path = os.path.join(repo_root, '.pit', 'index')
-        with open(index_path, 'w') as f:
-            for path, hash_val in sorted(head_files.items()):
-                f.write(f"{hash_val} 0 0 {path}\n")
-        
-        # 2. Update workdir to match HEAD
-        # Restore HEAD files
-        for path, hash_val in head_files.items():
-            obj_type, content = objects.read_object(repo_root, hash_val)
-            full_path = os.path.join(repo_root, path)
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, 'wb') as f:
-                f.write(content)
-        
-        # Clean up files that were stashed (modified/added) but are not in HEAD
-        # (i.e. revert changes to tracked files, and remove staged new files)
-        # Note: We must NOT delete untracked files that were NOT stashed.
-        
-        # Iterate files in workdir_index (which contains everything we stashed)
-        for path in workdir_index:
-             if path not in head_files:
-                 # It was in the stash, but not in HEAD. It must be a file we added to index.
-                 # Since we are resetting to HEAD, we should remove it.
-                 full_path = os.path.join(repo_root, path)
-                 if os.path.exists(full_path):
-                     os.remove(full_path)
-             # If path IS in head_files, we already overwrote it above with HEAD version.
+    msg = args.message if hasattr(args, 'message') and args.message else f"WIP on {branch}: {head_commit[:7] if head_commit else 'initial'}"
+    workdir_commit_hash = _create_stash_commit(repo_root, tree_hash_wd, wd_parents, msg, user)
 
-                     
-    else:
-        # No HEAD. Stash saves everything. Reset means empty?
-        # Remove all tracked-like files?
-        pass
+    return workdir_commit_hash, msg, head_files, workdir_index
 
 
 def pop(args):
     repo_root = repository.find_repo_root()
-    log_path = os.path.join(repo_root, '.pit', 'logs', 'stash')
+    log_path = _log_path(repo_root)
     
     if not os.path.exists(log_path):
         print("No stash entries found.")
         return
 
     # Read log
-    with open(log_path, 'r') as f:
-        lines = f.read().splitlines()
+    with open(log_path, 'rb') as f:
+        log_data = f.read()
+    lines = log_data.decode().splitlines()
         
     if not lines:
         print("No stash entries found.")
@@ -197,11 +231,8 @@ def pop(args):
     try:
         # Get commit object
         obj_type, content = objects.read_object(repo_root, stash_commit_hash)
-        lines_content = content.decode().splitlines()
-        parents = []
-        for line in lines_content:
-            if line.startswith('parent '):
-                parents.append(line.split(' ')[1])
+        header = content.partition(b'\n\n')[0]
+        parents = [parent.decode() for parent in _PARENT_RE.findall(header)]
         
         if len(parents) < 2:
              print("Error: Stash commit seems corrupted (missing index parent).")
@@ -213,38 +244,39 @@ def pop(args):
         # Restore WorkDir
         workdir_files = objects.get_commit_files(repo_root, stash_commit_hash)
         for path, hash_val in workdir_files.items():
-            obj_type, content = objects.read_object(repo_root, hash_val)
-            full_path = os.path.join(repo_root, path)
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, 'wb') as f:
-                f.write(content)
+            _restore_blob(repo_root, path, hash_val)
 
         # Restore Index
         # We need to build the index dictionary.
         # While building, if the file content in index matches workdir, we grab the stat from disk.
         if index_parent:
             index_files = objects.get_commit_files(repo_root, index_parent)
-            index_path = os.path.join(repo_root, '.pit', 'index')
-            with open(index_path, 'w') as f:
-                for path, hash_val in sorted(index_files.items()):
-                    # Check if file on disk matches hash (implicit via hash match)
-                    mtime = 0
-                    size = 0
-                    
-                    if path in workdir_files and workdir_files[path] == hash_val:
-                        # Content matches! Use real stats.
-                        full_path = os.path.join(repo_root, path)
-                        if os.path.exists(full_path):
-                            stats = os.stat(full_path)
-                            mtime = stats.st_mtime_ns
-                            size = stats.st_size
-                            
-                    f.write(f"{hash_val} {mtime} {size} {path}\n")
+            new_index = {}
+            for path, hash_val in index_files.items():
+                # Check if file on disk matches hash (implicit via hash match)
+                mtime = 0
+                size = 0
+                
+                if path in workdir_files and workdir_files[path] == hash_val:
+                    # Content matches! Use real stats.
+                    full_path = os.path.join(repo_root, path)
+                    if os.path.exists(full_path):
+                        stats = os.stat(full_path)
+                        mtime = stats.st_mtime_ns
+                        size = stats.st_size
+                        
+                new_index[path] = (hash_val, mtime, size)
+            index_utils.write_index(repo_root, new_index)
 
-        # Remove from log
-        lines.pop()
-        with open(log_path, 'w') as f:
-            f.write('\n'.join(lines) + ('\n' if lines else ''))
+        # Remove from log: the log only ever grows at the end, so cutting off the last entry is a truncate
+        last_entry = lines.pop().encode()
+        body = log_data.rstrip(b'\r\n')
+        if last_entry and body.endswith(last_entry):
+            os.truncate(log_path, len(body) - len(last_entry))
+        else:
+            # Malformed log (e.g. trailing blank lines): fall back to rewriting it
+            with open(log_path, 'w') as f:
+                f.write('\n'.join(lines) + ('\n' if lines else ''))
             
         print(f"Dropped refs/stash@{{{len(lines)}}} ({stash_commit_hash[:7]})")
         
@@ -253,87 +285,101 @@ def pop(args):
          sys.exit(1)
 
 def _is_clean(repo_root):
-    from utils import diff as diff_utils
-    
-    # Check HEAD vs Index
+    # Returns False on the first dirty path found; True only once every tracked file has been checked
+    # 1. HEAD vs Index: any staged change means dirty
     head_commit = repository.get_head_commit(repo_root)
-    files1_head = objects.get_commit_files(repo_root, head_commit) if head_commit else {}
+    head_files = objects.get_commit_files(repo_root, head_commit) if head_commit else {}
     
+    racy_mtime = index_utils.index_mtime(repo_root)
     index_full = objects.read_index(repo_root)
-    files2_idx = {path: data[0] for path, data in index_full.items()}
-    
-    staged = diff_utils.compare_states(files1_head, files2_idx)
-    if any(staged.values()):
+    if len(head_files) != len(index_full):
         return False
-        
-    # Check Index vs Workdir
-    # Reuse diff._get_working_dir_files? Or status logic.
-    # Let's import from COMMANDS.diff is tricky due to circular imports potential.
-    # Re-implement simple logic or import cautiously. 
-    # Actually stash.py imports utils.objects.
-    # Let's import diff logic from commands.diff if possible or copy `_get_working_dir_files`.
-    # Copying _get_working_dir_files logic is safer to avoid circular dep with commands module structure.
+    for path, data in index_full.items():
+        if head_files.get(path) != data[0]:
+            return False
     
-    working_files = {}
+    # 2. Index vs Workdir: only tracked files matter, untracked files never block a pop
     ignore_patterns = ignore.get_ignored_patterns(repo_root)
-    for root, dirs, files in os.walk(repo_root):
-        if '.pit' in dirs:
-            dirs.remove('.pit')
-        for file in files:
-            path = os.path.relpath(os.path.join(root, file), repo_root)
-            if not ignore.is_ignored(path, ignore_patterns):
-                 try:
-                    with open(os.path.join(root, file), 'rb') as f:
-                         content = f.read()
-                    working_files[path] = objects.hash_object(repo_root, content, 'blob', write=False)
-                 except Exception:
-                     pass
-                 
-    unstaged = diff_utils.compare_states(files2_idx, working_files)
-    if any(unstaged['modified']) or any(unstaged['deleted']):
-        # Note: untracked files (new file in unstaged) usually don't block pop in git unless they conflict.
-        # Provide strict safety: if ANY modified/deleted, abort.
-        return False
-        
-    return True
+    seen = 0
+    to_hash = []
+    queue_hash, index_get = to_hash.append, index_full.get # Bound once for the per-file loop
+    for path, entry in worktree.iter_working_files(repo_root, ignore_patterns):
+        idx_entry = index_get(path)
+        if idx_entry is None:
+            continue # Untracked, no need to read it
+        try:
+            stats = entry.stat()
+        except OSError:
+            return False # Unreadable tracked file counts as deleted
+        seen += 1
+        # Same stat-cache fast path as push(): unchanged mtime and size means the index hash still holds, unless racy
+        if idx_entry[1] == stats.st_mtime_ns and idx_entry[2] == stats.st_size and stats.st_mtime_ns < racy_mtime:
+            continue
+        queue_hash((path, entry.path))
+    
+    if seen != len(index_full):
+        return False # A tracked file is missing (deleted or ignored), decided before hashing anything
+    
+    def is_modified(job):
+        path, file_path = job
+        try:
+            # Only the id is needed here, so the file is streamed through SHA-1 without storing a blob
+            return objects.hash_file(file_path) != index_full[path][0]
+        except OSError:
+            return True
+    
+    return not parallel.parallel_any(is_modified, to_hash) # Stops hashing at the first modified file
 
 def list_stashes(args):
     repo_root = repository.find_repo_root()
-    log_path = os.path.join(repo_root, '.pit', 'logs', 'stash')
+    log_path = _log_path(repo_root)
     if not os.path.exists(log_path):
         return
 
-    with open(log_path, 'r') as f:
-        lines = f.read().splitlines()
-        
-    for i, commit_hash in enumerate(reversed(lines)):
-        # Read message
+    with open(log_path, 'rb') as f:
+        hashes = f.read().decode().split()
+    
+    # Every entry is formatted first and printed with one write, instead of a flushed write per stash
+    output = []
+    for i, commit_hash in enumerate(reversed(hashes)):
         try:
-            obj_type, content = objects.read_object(repo_root, commit_hash)
-            msg = ""
-            for line in content.decode().splitlines():
-                if not line.startswith('tree') and not line.startswith('parent') and not line.startswith('author') and not line.startswith('committer') and line.strip():
-                    msg = line
-                    break # Take first non-header line? Actually message is after empty line.
-            
-            # Better message extraction using existing utils if possible, or parse simply
-            parts = content.decode().split('\n\n', 1)
-            if len(parts) > 1:
-                msg = parts[1].splitlines()[0]
-                
-            print(f"stash@{{{i}}}: {msg}")
-        except:
-             print(f"stash@{{{i}}}: {commit_hash[:7]}")
+            output.append(f"stash@{{{i}}}: {_read_stash_message(repo_root, commit_hash)}")
+        except Exception:
+            output.append(f"stash@{{{i}}}: {commit_hash[:7]}")
+    if output:
+        print('\n'.join(output))
+
+def _read_stash_message(repo_root, commit_hash): # First line of a stash commit's message, inflating the object only up to that line
+    data = b''
+    with objects.open_object_stream(repo_root, commit_hash) as stream:
+        while True:
+            chunk = stream.read(1024)
+            data += chunk
+            # The message starts after the blank line ending the headers
+            body_start = data.find(b'\n\n')
+            if not chunk or (body_start != -1 and b'\n' in data[body_start + 2:]):
+                break
+    message = data.split(b'\n\n', 1)[1]
+    return message.split(b'\n', 1)[0].decode()
 
 def clear_stashes(args):
     repo_root = repository.find_repo_root()
-    log_path = os.path.join(repo_root, '.pit', 'logs', 'stash')
+    log_path = _log_path(repo_root)
     if os.path.exists(log_path):
         os.remove(log_path)
     print("Stash entries cleared.")
 
-def _create_stash_commit(repo_root, tree_hash, parents, message):
-    user_name, user_email = config.get_user_config(repo_root)
+def _log_path(repo_root): # The stash reflog, one stash commit hash per line, newest last
+    return os.path.join(repo_root, '.pit', 'logs', 'stash')
+
+def _restore_blob(repo_root, path, hash_val): # Writes a blob to its workdir path, streamed instead of inflated whole in memory
+    full_path = os.path.join(repo_root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with objects.open_object_stream(repo_root, hash_val) as src, open(full_path, 'wb') as f:
+        shutil.copyfileobj(src, f, 64 * 1024)
+
+def _create_stash_commit(repo_root, tree_hash, parents, message, user=None): # user is an optional (name, email) already read by the caller
+    user_name, user_email = user if user is not None else config.get_user_config(repo_root)
     timestamp = int(time.time())
     timezone = time.strftime('%z', time.localtime())
     author = f"{user_name or 'Pit User'} <{user_email or 'pit@example.com'}> {timestamp} {timezone}"
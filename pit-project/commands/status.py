@@ -3,9 +3,8 @@
 # How it does: It generates three dictionaries of {path: hash} for the three states. It then compares these dictionaries to find staged changes (HEAD vs. index), unstaged changes (index vs. workdir), and untracked files (files in workdir but not in index)
 # What data structure it uses: Hash Table / Dictionary (to represent the three states for efficient O(1) average time complexity lookups), Sets (for efficient comparison of file lists to find additions/deletions in O(N) time)
 
-import os
 import sys
-from utils import repository, objects, ignore, index as index_utils
+from utils import repository, objects, ignore, worktree, parallel, index as index_utils
 
 def run(args): # Compares the HEAD, index, and working directory states and prints the status
     repo_root = repository.find_repo_root()
@@ -18,34 +17,57 @@ def run(args): # Compares the HEAD, index, and working directory states and prin
 
     # Get status of HEAD vs Index (staged changes)
     head_commit = repository.get_head_commit(repo_root)
-    head_files = objects.get_commit_files(repo_root, head_commit) if head_commit else {}
+    head_files = objects.get_commit_files_cached(repo_root, head_commit) # Flat on-disk listing, reused while HEAD stays put
     
-    # Get index files using centralized function
-    index_files = index_utils.read_index_hashes(repo_root)
+    # Get index files using centralized function; the full entries carry the stat data used as a hash cache
+    racy_mtime = index_utils.index_mtime(repo_root) # Taken before the read, so it is never newer than the entries it guards
+    index_full = index_utils.read_index(repo_root)
+    index_files = {path: data[0] for path, data in index_full.items()}
 
     # Get status of Index vs Working Directory (unstaged changes)
     working_files = {}
     ignore_patterns = ignore.get_ignored_patterns(repo_root)
-    for root, dirs, files in os.walk(repo_root):
-        # Filter out the .pit directory
-        if '.pit' in dirs:
-            dirs.remove('.pit')
-            
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, repo_root)
-            
-            if not ignore.is_ignored(rel_path, ignore_patterns):
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                working_files[rel_path] = objects.hash_object(repo_root, content, 'blob', write=False)
+    # scandir-based walk: skips .pit, types come from the directory listing, rel paths are built by joining names
+    to_hash = []
+    for rel_path, entry in worktree.iter_working_files(repo_root, ignore_patterns):
+        idx_entry = index_full.get(rel_path)
+        if idx_entry is None:
+            working_files[rel_path] = None # Untracked: only its presence is reported, so it is never stat'ed or read
+            continue
+        stats = entry.stat() # Cached from the directory scan where the platform provides it
+        # Stat cache: a tracked file whose mtime and size still match its index entry keeps the index hash, unread,
+        # unless the entry is racy (file mtime not older than the index), in which case it is hashed
+        if idx_entry[1] == stats.st_mtime_ns and idx_entry[2] == stats.st_size and stats.st_mtime_ns < racy_mtime:
+            working_files[rel_path] = idx_entry[0]
+        else:
+            to_hash.append((rel_path, entry.path, stats))
+    
+    def hash_file(job):
+        rel_path, file_path, stats = job
+        return rel_path, objects.hash_file(file_path) # Streamed, so a large file is never held in memory
+    
+    # Reads and SHA-1 release the GIL, so threads overlap file I/O with hashing
+    working_files.update(parallel.parallel_map(hash_file, to_hash))
+    
+    # Tracked files that were re-hashed but turned out unchanged get fresh stat data, so the next status skips them
+    refreshed = False
+    for rel_path, _, stats in to_hash:
+        idx_entry = index_full[rel_path]
+        if idx_entry[0] == working_files[rel_path] and stats.st_mtime_ns < racy_mtime: # A racy file's stat data is never recorded
+            index_full[rel_path] = (idx_entry[0], stats.st_mtime_ns, stats.st_size)
+            refreshed = True
+    if refreshed and index_utils.index_mtime(repo_root) == racy_mtime: # Skipped if another command rewrote the index meanwhile
+        try:
+            index_utils.write_index(repo_root, index_full) # Written to a temp file and renamed over the index
+        except OSError:
+            pass # Refreshing is only an optimization; a read-only repo still gets its status
     
     #Comapring staged and unstaged changes
     staged_changes = _compare_dicts(head_files, index_files)
     unstaged_changes = _compare_dicts(index_files, working_files)
     
-    # Untracked files are in working dir but not in index
-    untracked_files = sorted(list(set(working_files.keys()) - set(index_files.keys())))
+    # Untracked files are in working dir but not in index: exactly the unstaged "new file" set
+    untracked_files = sorted(unstaged_changes['new file'])
 
     _print_status("Changes to be committed", staged_changes)
     _print_status("Changes not staged for commit", {'modified': unstaged_changes['modified'], 'deleted': unstaged_changes['deleted']})
@@ -57,23 +79,21 @@ def run(args): # Compares the HEAD, index, and working directory states and prin
         for path in untracked_files:
             print(f"\t{path}")
 
-def _compare_dicts(d1, d2): # Compares two {path: hash} dictionaries and returns a dict of changes
+# Compares two {path: hash} dictionaries and returns a dict of changes.
+# The lists are unordered; sorting is left to printing, so lists that are never shown are never sorted
+def _compare_dicts(d1, d2):
     changes = {'new file': [], 'modified': [], 'deleted': []}
     
-    keys1, keys2 = set(d1.keys()), set(d2.keys())
+    keys1, keys2 = d1.keys(), d2.keys() # Views support set operations without copying the keys
     
     # New files (in d2 but not d1)
-    for path in sorted(list(keys2 - keys1)):
-        changes['new file'].append(path)
+    changes['new file'] = list(keys2 - keys1)
         
     # Deleted files (in d1 but not d2)
-    for path in sorted(list(keys1 - keys2)):
-        changes['deleted'].append(path)
+    changes['deleted'] = list(keys1 - keys2)
         
     # Modified files (in both but with different hashes)
-    for path in sorted(list(keys1 & keys2)):
-        if d1[path] != d2[path]:
-            changes['modified'].append(path)
+    changes['modified'] = [path for path in keys1 & keys2 if d1[path] != d2[path]]
             
     return changes
 
@@ -84,6 +104,6 @@ def _print_status(header, changes):
         
     print(f"\n{header}:")
     for change_type, paths in changes.items():
-        for path in paths:
+        for path in sorted(paths):
             print(f"\t{change_type}:   {path}")
 
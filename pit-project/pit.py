@@ -1,197 +1,182 @@
 import argparse
+import importlib
+import os
 import sys
 import shlex
-from utils.config import read_config
 
-from commands import (
-    init, add, commit, log, status, config,
-    branch, checkout, diff, merge, reset,
-    revert, clean, rebase, mergetool, difftool, stash,
-    # remote, push, pull, clone
-)
+# Command modules are imported on demand: a command's handler is commands.<name>.run, and only the module of the
+# command actually run is loaded
 
-# The main entry point for the Pit version control system
-def main():
-    # Handle aliases
-    if len(sys.argv) > 1:
-        potential_alias = sys.argv[1]
-        # Skip if it's a known command to avoid overhead/conflict, OR just always check config
-        # The prompt says: "check the [alias] section of the config before parsing standard commands."
-        # If I check config first, I can override standard commands maybe? 
-        # Usually aliases shouldn't shadow commands, but checking config first is what was asked.
-        # However, checking if it is NOT a known command first is safer to prevent accidental shadowing?
-        # Prompt: "If the first argument is not a known command, check .pit/options (or config dictionary) for alias.<cmd>."
-        
-        # known commands list from the subparsers? subparsers are defined later.
-        # I can list them manually or just try to load config.
-        # Let's list known commands.
-        known_commands = {
-            "init", "add", "commit", "log", "status", "config",
-            "branch", "checkout", "diff", "merge", "reset",
-            "revert", "clean", "stash", "rebase", "difftool", "mergetool"
-        }
-        
-        if potential_alias not in known_commands:
-            cfg = read_config()
-            if cfg.has_option('alias', potential_alias):
-                alias_value = cfg.get('alias', potential_alias)
-                # Split the alias value (e.g., "log --oneline")
-                alias_args = shlex.split(alias_value)
-                # Replace the alias in sys.argv
-                sys.argv[1:2] = alias_args
-                # sys.argv will be used by parse_args() automatically
-
-    # The main parser
-    parser = argparse.ArgumentParser(description="Pit: A simple version control system.")
-    subparsers = parser.add_subparsers(dest="command", help="Available commands", required=True)
-
-    # Command: init
-    init_parser = subparsers.add_parser("init", help="Initialize a new, empty repository.")
-    init_parser.set_defaults(func=init.run)
-
-    # Command: add
-    add_parser = subparsers.add_parser("add", help="Add file contents to the index.")
-    add_parser.add_argument("files", nargs="*", help="Files to add.")
-    add_parser.add_argument("-A", "--all", action="store_true", help="Add all files in the repository.")
-    add_parser.set_defaults(func=add.run)
-
-    # Command: commit
-    commit_parser = subparsers.add_parser("commit", help="Record changes to the repository.")
-    commit_parser.add_argument("-m", "--message", required=True, help="Commit message.")
-    commit_parser.set_defaults(func=commit.run)
-
-    # Command: log
-    log_parser = subparsers.add_parser("log", help="Show commit logs.")
-    log_parser.add_argument("--oneline", action="store_true", help="Show one commit per line.")
-    log_parser.add_argument("--graph", action="store_true", help="Show ASCII graph of commit history.")
-    log_parser.add_argument("--since", help="Show commits more recent than specific date.")
-    log_parser.add_argument("--grep", help="Filter commits by message pattern.")
-    log_parser.add_argument("--patch", "-p", action="store_true", help="Show patch for specified file.")
-    log_parser.add_argument("file", nargs="?", help="Show only commits affecting specific file.")
-    log_parser.add_argument("-n", "--max-count", type=int, help="Limit number of commits to show.")
-    log_parser.set_defaults(func=log.run)
-
-    # Command: status
-    status_parser = subparsers.add_parser("status", help="Show the working tree status.")
-    status_parser.set_defaults(func=status.run)
-
-    # Command: config
-    config_parser = subparsers.add_parser("config", help="Set configuration options (e.g., user.name, github.token).")
-    config_parser.add_argument("key", help="The configuration key (e.g., user.name or github.token).")
-    config_parser.add_argument("value", help="The configuration value.")
-    config_parser.set_defaults(func=config.run)
-
-    # Command: branch
-    branch_parser = subparsers.add_parser("branch", help="List or create branches.")
-    branch_parser.add_argument("name", nargs="?", help="The name of the branch to create.")
-    branch_parser.set_defaults(func=branch.run)
-
-    #Command: checkout
-    checkout_parser = subparsers.add_parser("checkout", help="Switch branches or restore working tree files.")
-    checkout_parser.add_argument("targets", nargs="+", help="Branch name to switch to, or file(s) to restore from index.")
-    checkout_parser.add_argument("-b", "--branch", action="store_true", help="Create a new branch and switch to it.")
-    checkout_parser.set_defaults(func=checkout.run)
-    
+# Argument definitions, one function per command, so a single command's parser can be built on its own
+def _init_arguments(parser):
+    pass
+
+def _add_arguments(parser):
+    parser.add_argument("files", nargs="*", help="Files to add.")
+    parser.add_argument("-A", "--all", action="store_true", help="Add all files in the repository.")
+
+def _commit_arguments(parser):
+    parser.add_argument("-m", "--message", required=True, help="Commit message.")
+
+def _log_arguments(parser):
+    parser.add_argument("--oneline", action="store_true", help="Show one commit per line.")
+    parser.add_argument("--graph", action="store_true", help="Show ASCII graph of commit history.")
+    parser.add_argument("--since", help="Show commits more recent than specific date.")
+    parser.add_argument("--grep", help="Filter commits by message pattern.")
+    parser.add_argument("--patch", "-p", action="store_true", help="Show patch for specified file.")
+    parser.add_argument("file", nargs="?", help="Show only commits affecting specific file.")
+    parser.add_argument("-n", "--max-count", type=int, help="Limit number of commits to show.")
+
+def _status_arguments(parser):
+    pass
+
+def _config_arguments(parser):
+    parser.add_argument("key", help="The configuration key (e.g., user.name or github.token).")
+    parser.add_argument("value", help="The configuration value.")
+
+def _branch_arguments(parser):
+    parser.add_argument("name", nargs="?", help="The name of the branch to create.")
+
+def _checkout_arguments(parser):
+    parser.add_argument("targets", nargs="+", help="Branch name to switch to, or file(s) to restore from index.")
+    parser.add_argument("-b", "--branch", action="store_true", help="Create a new branch and switch to it.")
+
+def _diff_arguments(parser):
+    parser.add_argument("--staged", action="store_true", help="Show changes between the index and the last commit.")
 
-    # Command: diff
-    diff_parser = subparsers.add_parser("diff", help="Show changes between index and working tree.")
-    diff_parser.add_argument("--staged", action="store_true", help="Show changes between the index and the last commit.")
-    diff_parser.set_defaults(func=diff.run)
-
-    # Command: difftool
-    difftool_parser = subparsers.add_parser("difftool", help="Show changes using external diff tool.")
-    difftool_parser.add_argument("--staged", action="store_true", help="Show changes between the index and the last commit.")
-    difftool_parser.set_defaults(func=difftool.run)
-
-    # Command: mergetool
-    mergetool_parser = subparsers.add_parser("mergetool", help="Resolve merge conflicts using external merge tool.")
-    mergetool_parser.set_defaults(func=mergetool.run)
-
-    # Command: merge
-    merge_parser = subparsers.add_parser("merge", help="Merge a branch into the current branch.")
-    merge_parser.add_argument("branch", help="The branch to merge.")
-    merge_parser.set_defaults(func=merge.run)
-
-    # Command: reset
-    reset_parser = subparsers.add_parser("reset", help="Unstage files.")
-    reset_parser.add_argument("files", nargs="+", help="Files to unstage from the index.")
-    reset_parser.set_defaults(func=reset.run)
-
-    # Command: revert
-    revert_parser = subparsers.add_parser("revert", help="Revert an existing commit.")
-    revert_parser.add_argument("commit_hash", help="The commit hash to revert.")
-    revert_parser.set_defaults(func=revert.run)
-
-    # Command: clean
-    clean_parser = subparsers.add_parser("clean", help="Remove untracked files from the working tree.")
-    clean_parser.add_argument("-n", "--dry-run", action="store_true", dest="n", help="Show what would be removed.")
-    clean_parser.add_argument("-f", "--force", action="store_true", dest="f", help="Force deletion of untracked files.")
-    clean_parser.add_argument("-d", action="store_true", help="Remove untracked directories as well.")
-    clean_parser.set_defaults(func=clean.run)
-
-    # Command: rebase
-    rebase_parser = subparsers.add_parser("rebase", help="Reapply commits on top of another base tip.")
-    rebase_parser.add_argument("upstream", nargs="?", help="Upstream branch to rebase onto.")
-    rebase_parser.add_argument("--continue", action="store_true", dest="cont", help="Continue the rebase after resolving conflicts.")
-    rebase_parser.add_argument("--abort", action="store_true", help="Abort the rebase and return to original state.")
-    rebase_parser.set_defaults(func=rebase.run)
-
-    # Command: stash
-    stash_parser = subparsers.add_parser("stash", help="Stash the changes in a dirty working directory.")
-    stash_subparsers = stash_parser.add_subparsers(dest="stash_command", help="Stash subcommands")
+def _difftool_arguments(parser):
+    parser.add_argument("--staged", action="store_true", help="Show changes between the index and the last commit.")
+
+def _mergetool_arguments(parser):
+    pass
+
+def _merge_arguments(parser):
+    parser.add_argument("branch", help="The branch to merge.")
+
+def _reset_arguments(parser):
+    parser.add_argument("files", nargs="+", help="Files to unstage from the index.")
+
+def _revert_arguments(parser):
+    parser.add_argument("commit_hash", help="The commit hash to revert.")
+
+def _clean_arguments(parser):
+    parser.add_argument("-n", "--dry-run", action="store_true", dest="n", help="Show what would be removed.")
+    parser.add_argument("-f", "--force", action="store_true", dest="f", help="Force deletion of untracked files.")
+    parser.add_argument("-d", action="store_true", help="Remove untracked directories as well.")
+
+def _rebase_arguments(parser):
+    parser.add_argument("upstream", nargs="?", help="Upstream branch to rebase onto.")
+    parser.add_argument("--continue", action="store_true", dest="cont", help="Continue the rebase after resolving conflicts.")
+    parser.add_argument("--abort", action="store_true", help="Abort the rebase and return to original state.")
+
+def _stash_arguments(parser):
+    stash_subparsers = parser.add_subparsers(dest="stash_command", help="Stash subcommands")
     
     # stash push
     stash_push_parser = stash_subparsers.add_parser("push", help="Save your local modifications to a new stash entry.")
     stash_push_parser.add_argument("-m", "--message", help="Stash message.")
     
     # stash pop
-    stash_pop_parser = stash_subparsers.add_parser("pop", help="Remove a stash entry and apply it to the working directory.")
+    stash_subparsers.add_parser("pop", help="Remove a stash entry and apply it to the working directory.")
     
     # stash list
-    stash_list_parser = stash_subparsers.add_parser("list", help="List stash entries.")
+    stash_subparsers.add_parser("list", help="List stash entries.")
     
     # stash clear
-    _stash_clear_parser = stash_subparsers.add_parser("clear", help="Remove all stash entries.")
-    
-    stash_parser.set_defaults(func=stash.run)
-
-    # # Command: remote
-    # remote_parser = subparsers.add_parser("remote", help="Manage remote repositories (HTTPS only)")
-    # remote_parser.add_argument("subcommand", help="Subcommand: add, remove, list, set-url")
-    # remote_parser.add_argument("name", nargs="?", help="Remote name")
-    # remote_parser.add_argument("url", nargs="?", help="HTTPS URL (e.g., https://github.com/user/repo.git)")
-    # remote_parser.set_defaults(func=remote.run)
-
-    # # Command: push
-    # push_parser = subparsers.add_parser("push", help="Push to remote repository via HTTPS")
-    # push_parser.add_argument("remote", help="Remote name")
-    # push_parser.add_argument("branch", help="Branch to push")
-    # push_parser.add_argument("-u", "--set-upstream", action="store_true",
-    # #                         help="Set upstream branch tracking")
-    # push_parser.add_argument("-f", "--force", action="store_true",
-    # #                         help="Force push (overwrite remote)")
-    # push_parser.set_defaults(func=push.run)
-
-    # # Command: pull
-    # pull_parser = subparsers.add_parser("pull", help="Fetch and integrate changes from remote")
-    # pull_parser.add_argument("remote", help="Remote name")
-    # pull_parser.add_argument("branch", help="Branch to pull")
-    # pull_parser.set_defaults(func=pull.run)
-
-    # # Command: clone
-    # clone_parser = subparsers.add_parser("clone", help="Clone a repository into a new directory.")
-    # clone_parser.add_argument("repository_url", help="The HTTPS URL of the repository to clone.")
-    # clone_parser.add_argument("directory", nargs="?", help="The name of the directory to clone into.")
-    # clone_parser.set_defaults(func=clone.run)
-
-    # Parse the arguments
-    args = parser.parse_args()
-
-    # If a command was specified, run its function
-    if hasattr(args, 'func'):
-        args.func(args)
+    stash_subparsers.add_parser("clear", help="Remove all stash entries.")
+
+# def _remote_arguments(parser):
+#     parser.add_argument("subcommand", help="Subcommand: add, remove, list, set-url")
+#     parser.add_argument("name", nargs="?", help="Remote name")
+#     parser.add_argument("url", nargs="?", help="HTTPS URL (e.g., https://github.com/user/repo.git)")
+
+# def _push_arguments(parser):
+#     parser.add_argument("remote", help="Remote name")
+#     parser.add_argument("branch", help="Branch to push")
+#     parser.add_argument("-u", "--set-upstream", action="store_true", help="Set upstream branch tracking")
+#     parser.add_argument("-f", "--force", action="store_true", help="Force push (overwrite remote)")
+
+# def _pull_arguments(parser):
+#     parser.add_argument("remote", help="Remote name")
+#     parser.add_argument("branch", help="Branch to pull")
+
+# def _clone_arguments(parser):
+#     parser.add_argument("repository_url", help="The HTTPS URL of the repository to clone.")
+#     parser.add_argument("directory", nargs="?", help="The name of the directory to clone into.")
+
+# Every command: name -> (help text, argument definitions); the handler is commands.<name>.run
+COMMANDS = {
+    "init": ("Initialize a new, empty repository.", _init_arguments),
+    "add": ("Add file contents to the index.", _add_arguments),
+    "commit": ("Record changes to the repository.", _commit_arguments),
+    "log": ("Show commit logs.", _log_arguments),
+    "status": ("Show the working tree status.", _status_arguments),
+    "config": ("Set configuration options (e.g., user.name, github.token).", _config_arguments),
+    "branch": ("List or create branches.", _branch_arguments),
+    "checkout": ("Switch branches or restore working tree files.", _checkout_arguments),
+    "diff": ("Show changes between index and working tree.", _diff_arguments),
+    "difftool": ("Show changes using external diff tool.", _difftool_arguments),
+    "mergetool": ("Resolve merge conflicts using external merge tool.", _mergetool_arguments),
+    "merge": ("Merge a branch into the current branch.", _merge_arguments),
+    "reset": ("Unstage files.", _reset_arguments),
+    "revert": ("Revert an existing commit.", _revert_arguments),
+    "clean": ("Remove untracked files from the working tree.", _clean_arguments),
+    "rebase": ("Reapply commits on top of another base tip.", _rebase_arguments),
+    "stash": ("Stash the changes in a dirty working directory.", _stash_arguments),
+    # "remote": ("Manage remote repositories (HTTPS only)", _remote_arguments),
+    # "push": ("Push to remote repository via HTTPS", _push_arguments),
+    # "pull": ("Fetch and integrate changes from remote", _pull_arguments),
+    # "clone": ("Clone a repository into a new directory.", _clone_arguments),
+}
+
+def _mentions_alias(config_path): # Cheap pre-check: only a config file containing an [alias] header can define aliases
+    try:
+        with open(config_path, 'rb') as f:
+            return b'[alias]' in f.read()
+    except OSError:
+        return False
+
+def _lookup_alias(name): # Returns the alias' value, or None; the config is only parsed when some config file declares [alias]
+    from utils import config, repository
+    config_paths = [config.get_global_config_path()]
+    repo_root = repository.find_repo_root()
+    if repo_root:
+        config_paths.append(config.get_config_path(repo_root))
+    if not any(_mentions_alias(path) for path in config_paths):
+        return None
+    return config.read_config().get('alias', {}).get(name)
+
+# The main entry point for the Pit version control system
+def main():
+    # Handle aliases
+    # If the first argument is not a known command, check the [alias] section of the config for alias.<cmd>.
+    # Known commands never shadow aliases and never pay for reading the config
+    if len(sys.argv) > 1 and sys.argv[1] not in COMMANDS:
+        alias_value = _lookup_alias(sys.argv[1])
+        if alias_value is not None:
+            # Split the alias value (e.g., "log --oneline") and replace the alias in sys.argv
+            sys.argv[1:2] = shlex.split(alias_value)
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command in COMMANDS:
+        # Fast path: build a parser for just this command, as its subparser would be (same prog, usage and errors)
+        _, add_arguments = COMMANDS[command]
+        parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} {command}")
+        add_arguments(parser)
+        args = parser.parse_args(sys.argv[2:])
+        args.command = command
     else:
-        parser.print_help()
+        # No or unknown command, or top-level --help: the top-level parser produces the usage, listing or error.
+        # No command matched, so the subparsers only need their names and help, not their arguments
+        parser = argparse.ArgumentParser(description="Pit: A simple version control system.")
+        subparsers = parser.add_subparsers(dest="command", help="Available commands", required=True)
+        for name, (help_text, _) in COMMANDS.items():
+            subparsers.add_parser(name, help=help_text)
+        args = parser.parse_args()
+
+    # Import the command's module and run its function
+    module = importlib.import_module(f'commands.{args.command}')
+    module.run(args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
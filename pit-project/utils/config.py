@@ -1,39 +1,79 @@
 # What it does: Manages all read/write operations for the `.pit/config` file
-# What data structure it uses: Map / Hash Table / Dictionary (the INI file format is a map of sections to key-value pairs, managed by Python's `configparser`)
+# What data structure it uses: Map / Hash Table / Dictionary (the INI file format is a map of sections to key-value pairs; read into nested dicts by a small parser, written with Python's `configparser`)
 
-import configparser
 import os
-from .repository import find_repo_root
+import io
+from .repository import find_repo_root, atomic_write
 def get_global_config_path():
     return os.path.expanduser("~/.pitconfig")
 
 def read_global_config():
+    import configparser # Only the write path and this full parse need it; read_config doesn't
     config = configparser.ConfigParser()
-    global_path = get_global_config_path()
-    if os.path.exists(global_path):
-        config.read(global_path)
+    config.read(get_global_config_path()) # configparser skips a missing file itself
     return config
 
 
 def get_config_path(repo_root):  # Returns the path to the config file within the repository
     return os.path.join(repo_root, '.pit', 'config')
 
-def read_config():
-    merged_config = configparser.ConfigParser()
+# The last merged config and the stat key it was parsed under: {'key': (...), 'cfg': ConfigParser}
+_CONFIG_CACHE = {}
+
+def _stat_key(path): # (mtime_ns, size) of a config file, or (0, 0) when it doesn't exist
+    try:
+        stats = os.stat(path)
+    except OSError:
+        return 0, 0
+    return stats.st_mtime_ns, stats.st_size
+
+def invalidate_config_cache():
+    _CONFIG_CACHE.clear()
+
+def _fast_parse_ini(path): # {section: {key: value}} for the INI subset write_config produces: no interpolation, no DEFAULT section
+    sections = {}
+    try:
+        with open(path, 'r') as f:
+            data = f.read()
+    except OSError:
+        return sections
+    
+    current, last_key = None, None
+    for line in data.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped[0] in '#;':
+            continue
+        if stripped[0] == '[' and stripped[-1] == ']':
+            current, last_key = sections.setdefault(stripped[1:-1], {}), None
+        elif current is None:
+            continue
+        elif line[0] in ' \t' and last_key is not None:
+            current[last_key] += '\n' + stripped # Indented continuation of a multi-line value
+        else:
+            key, sep, value = stripped.partition('=')
+            if sep:
+                last_key = key.strip().lower() # Option names are case-insensitive, as in configparser
+                current[last_key] = value.strip()
+    return sections
+
+def read_config(): # Merged global + local config as {section: {key: value}}; re-parsed only when either file's mtime or size changes. Treat the result as read-only
+    global_path = get_global_config_path()
+    repo_root = find_repo_root()
+    local_path = get_config_path(repo_root) if repo_root else None
+    key = (repo_root, _stat_key(global_path), _stat_key(local_path) if local_path else None)
+    if _CONFIG_CACHE.get('key') == key:
+        return _CONFIG_CACHE['cfg']
 
     # 1. Read global config
-    global_config = read_global_config()
-    merged_config.read_dict(global_config)
+    merged_config = _fast_parse_ini(global_path)
 
     # 2. Read local repo config (overrides global)
-    repo_root = find_repo_root()
-    if repo_root:
-        local_config_path = get_config_path(repo_root)
-        if os.path.exists(local_config_path):
-            local_config = configparser.ConfigParser()
-            local_config.read(local_config_path)
-            merged_config.read_dict(local_config)
+    if local_path:
+        for section, values in _fast_parse_ini(local_path).items():
+            merged_config.setdefault(section, {}).update(values)
 
+    _CONFIG_CACHE['key'] = key
+    _CONFIG_CACHE['cfg'] = merged_config
     return merged_config
 
 
@@ -42,12 +82,12 @@ def write_config(key, value): # Sets a configuration key to a value and writes i
     if not repo_root:
         raise FileNotFoundError("Not a Pit repository.")
 
+    import configparser # Kept for writing, so rewritten files keep configparser's exact format
     config_path = get_config_path(repo_root)
     os.makedirs(os.path.dirname(config_path), exist_ok=True)
     config = configparser.ConfigParser()
 
-    if os.path.exists(config_path):
-        config.read(config_path)
+    config.read(config_path) # A missing file just leaves the config empty
 
     try:
         section, option = key.split('.', 1)
@@ -59,11 +99,12 @@ def write_config(key, value): # Sets a configuration key to a value and writes i
     
     config.set(section, option, value)
     
-    with open(config_path, 'w') as configfile:
-        config.write(configfile)
+    # Rendered in memory, then written to a temp file and renamed over the config, so it is never seen half-written
+    buffer = io.StringIO()
+    config.write(buffer)
+    atomic_write(config_path, buffer.getvalue())
+    invalidate_config_cache() # A rewrite within the same mtime tick and size must still be seen
 
 def get_user_config(repo_root):
-    config = read_config()
-    user_name = config.get('user', 'name', fallback=None)
-    user_email = config.get('user', 'email', fallback=None)
-    return user_name, user_email
+    user = read_config().get('user', {})
+    return user.get('name'), user.get('email')
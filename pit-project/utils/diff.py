@@ -4,23 +4,22 @@ import difflib
 
 def compare_states(state1, state2): # Compares two states represented as {path: hash} dictionaries
     
-    paths1 = set(state1.keys())
-    paths2 = set(state2.keys())
+    # Key views are already set-like, so the set operations run on them directly without copying either key set
+    paths1 = state1.keys()
+    paths2 = state2.keys()
 
-    added = sorted(list(paths2 - paths1))
-    deleted = sorted(list(paths1 - paths2))
-
-    modified = []
-    for path in sorted(list(paths1 & paths2)):
-        if state1[path] != state2[path]:
-            modified.append(path)
+    added = sorted(paths2 - paths1)
+    deleted = sorted(paths1 - paths2)
+    modified = sorted(path for path in paths1 & paths2 if state1[path] != state2[path]) # Only the changed paths get sorted
 
     return {'added': added, 'deleted': deleted, 'modified': modified}
 
-def get_diff_lines(content1, content2, from_file, to_file): #Generates unified diff lines between two contents
+def get_diff_lines(content1, content2, from_file, to_file): #Generates unified diff lines between two contents, as an iterator
     
-    content1_lines = content1.decode(errors='ignore').splitlines()
-    content2_lines = content2.decode(errors='ignore').splitlines()
+    # Split the raw bytes and decode line by line, so no whole-file str is built alongside the line list.
+    # bytes.splitlines only breaks on \n, \r and \r\n, not on form feeds or Unicode line separators inside a line
+    content1_lines = [line.decode(errors='ignore') for line in content1.splitlines()]
+    content2_lines = [line.decode(errors='ignore') for line in content2.splitlines()]
 
     diff = difflib.unified_diff(
         content1_lines,
@@ -30,4 +29,4 @@ def get_diff_lines(content1, content2, from_file, to_file): #Generates unified d
         lineterm=''
     )
 
-    return list(line + '\n' for line in diff)
\ No newline at end of file
+    return (line + '\n' for line in diff) # Lazy, so callers can stream the diff straight to stdout
\ No newline at end of file
@@ -1,30 +1,77 @@
 # What it does: Implements the `.pitignore` functionality
-# What data structure it uses: Set (to store the ignore patterns for efficient, near O(1) average time complexity lookups)
+# What data structure it uses: Set (to store the ignore patterns for efficient, near O(1) average time complexity lookups), compiled into one regex so each path is matched with a single call
 
 import os
-from fnmatch import fnmatch
+import re
+from fnmatch import translate
+from functools import lru_cache
+
+# Parsed .pitignore per repository: {repo_root: ((mtime_ns, size) or None, frozenset of patterns)}
+_IGNORE_CACHE = {}
 
 def get_ignored_patterns(repo_root):
     """
-    Reads the .pitignore file and returns a set of glob patterns.
+    Reads the .pitignore file and returns a frozenset of glob patterns.
+    The file is re-parsed only when its mtime or size changes.
     """
     ignore_file = os.path.join(repo_root, '.pitignore')
+    try:
+        stats = os.stat(ignore_file)
+        stat_key = (stats.st_mtime_ns, stats.st_size)
+    except OSError:
+        stat_key = None
+    cached = _IGNORE_CACHE.get(repo_root)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+    
     patterns = {'.pit', '.pit/*', '*.pyc', '__pycache__'} # Always ignore these
     
-    if os.path.exists(ignore_file):
+    if stat_key is not None:
         with open(ignore_file, 'r') as f:
             for line in f:
                 line = line.strip()
                 if line and not line.startswith('#'):
                     patterns.add(line)
+    patterns = frozenset(patterns) # Shared between calls, so it must not be mutated
+    _IGNORE_CACHE[repo_root] = (stat_key, patterns)
     return patterns
 
-def is_ignored(path, ignore_patterns): # Returns True if the path matches any ignore pattern
-    # Normalize path separators for cross-platform matching
-    normalized_path = path.replace(os.sep, '/')
-    for pattern in ignore_patterns:
-        # Normalize pattern separators
-        normalized_pattern = pattern.replace(os.sep, '/')
-        if fnmatch(normalized_path, normalized_pattern) or any(fnmatch(part, normalized_pattern) for part in normalized_path.split('/')):
-            return True
-    return False
+# Compiles a set of glob patterns into one regex (one alternation of fnmatch translations), memoized per pattern set
+@lru_cache(maxsize=16)
+def _compile(patterns):
+    if not patterns:
+        return re.compile(r'(?!)') # Matches nothing
+    # Normalize pattern separators; case-insensitive where fnmatch would be (os.path.normcase on Windows)
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile('|'.join(translate(pattern.replace(os.sep, '/')) for pattern in sorted(patterns)), flags)
+
+def compile_patterns(ignore_patterns): # Returns the compiled matcher for a pattern set; callers testing many paths pass the result to is_ignored instead of the set
+    if isinstance(ignore_patterns, re.Pattern):
+        return ignore_patterns
+    return _compile(frozenset(ignore_patterns))
+
+# Compiles the patterns that can rule out a whole directory by path: a glob ending in '*' that matches "dir/" also matches
+# everything below it, so is_ignored() would ignore every file there. Other path patterns ('src/gen/') never match a file
+# path, so a directory they name must still be walked
+@lru_cache(maxsize=16)
+def _compile_dirs(patterns):
+    return _compile(frozenset(pattern for pattern in patterns if pattern.endswith('*')))
+
+def compile_dir_patterns(ignore_patterns): # Returns the matcher for directory paths (with a trailing '/') a walker may skip without reading them
+    return _compile_dirs(frozenset(ignore_patterns))
+
+_SEP_IS_SLASH = os.sep == '/'
+
+def _matches(matcher, path): # True if the path, or any single component of it, matches
+    # Normalize path separators for cross-platform matching; already normalized where os.sep is '/'
+    normalized_path = path if _SEP_IS_SLASH else path.replace(os.sep, '/')
+    if matcher(normalized_path):
+        return True
+    return any(matcher(part) for part in normalized_path.split('/'))
+
+def is_ignored(path, ignore_patterns): # Returns True if the path, or any single component of it, matches an ignore pattern
+    return _matches(compile_patterns(ignore_patterns).match, path)
+
+def filter_ignored(paths, ignore_patterns): # Returns the set of paths that are ignored; the matcher is looked up once for the whole batch
+    matcher = compile_patterns(ignore_patterns).match
+    return {path for path in paths if _matches(matcher, path)}
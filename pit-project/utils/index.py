@@ -3,43 +3,89 @@
 # What data structure it uses: Dictionary (mapping file paths to tuples of hash, mtime, size)
 
 import os
+from .repository import temp_path
 
 # Reads the index file and returns a dictionary {path: (hash, mtime, size)}
 def read_index(repo_root):
     index_path = os.path.join(repo_root, '.pit', 'index')
     index_files = {}
-    if os.path.exists(index_path):
+    try: # Opening is the existence check; no separate stat
         with open(index_path, 'r') as f:
-            for line in f:
-                parts = line.strip().split(' ')
-                if len(parts) >= 4:
-                    hash_val = parts[0]
-                    mtime_ns = int(parts[1])
-                    size = int(parts[2])
-                    path = " ".join(parts[3:])
-                    index_files[path] = (hash_val, mtime_ns, size)
+            data = f.read() # One read for the whole index
+    except FileNotFoundError:
+        return index_files
+    for line in data.split('\n'): # Only '\n' ends an entry; splitlines() would also break paths at '\x0c', '\x85', '\u2028'...
+        # Split off the three fixed fields; the rest is the path, spaces included, with no re-joining
+        parts = line.split(' ', 3)
+        if len(parts) == 4:
+            hash_val, mtime_ns, size, path = parts
+            index_files[path] = (hash_val, int(mtime_ns), int(size))
     return index_files
 
+# The index file's own mtime_ns, or 0 when there is no index. Entries whose file mtime is not older than this are "racy":
+# the file may have changed within the same timestamp tick after the entry was recorded, so their stat data can't be trusted
+def index_mtime(repo_root):
+    try:
+        return os.stat(os.path.join(repo_root, '.pit', 'index')).st_mtime_ns
+    except OSError:
+        return 0
+
 # Returns a simplified dictionary {path: hash} without mtime/size
 def read_index_hashes(repo_root):
-    full_index = read_index(repo_root)
-    return {path: data[0] for path, data in full_index.items()}
+    index_path = os.path.join(repo_root, '.pit', 'index')
+    try:
+        with open(index_path, 'r') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    # Parsed straight from the lines: no (hash, mtime, size) tuples and no int() calls for fields that are dropped.
+    # Split on '\n' only, as read_index does, so paths keep any other line-break characters
+    return {parts[3]: parts[0] for parts in (line.split(' ', 3) for line in data.split('\n')) if len(parts) == 4}
 
 # Writes index dictionary to file in format: hash mtime size path
+# Values may be (hash, mtime, size) tuples or bare hashes, which are written with zeroed stat data
 def write_index(repo_root, index_dict):
     index_path = os.path.join(repo_root, '.pit', 'index')
     os.makedirs(os.path.dirname(index_path), exist_ok=True)
     
-    with open(index_path, 'w') as f:
-        for path in sorted(index_dict.keys()):
-            hash_val, mtime, size = index_dict[path]
-            f.write(f"{hash_val} {mtime} {size} {path}\n")
+    # Write to a temp file and rename it over the index, so a failure never leaves a truncated index
+    lines = []
+    for path in sorted(index_dict.keys()):
+        entry = index_dict[path]
+        if isinstance(entry, str):
+            hash_val, mtime, size = entry, 0, 0
+        else:
+            hash_val, mtime, size = entry
+        lines.append(f"{hash_val} {mtime} {size} {path}\n")
+    
+    tmp_path = temp_path(index_path)
+    with open(tmp_path, 'w') as f:
+        f.write(''.join(lines)) # One write call for the whole index
+    os.replace(tmp_path, index_path)
+
+class IndexSession: # Batches index edits: one read on entering, one write on leaving (skipped if the block raises)
+    def __init__(self, repo_root):
+        self.repo_root = repo_root
+        self.index = None
 
-# Updates a single entry in the index
+    def __enter__(self):
+        self.index = read_index(self.repo_root)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            write_index(self.repo_root, self.index)
+
+    def set(self, path, hash_val, mtime=0, size=0):
+        self.index[path] = (hash_val, mtime, size)
+
+    def remove(self, path):
+        self.index.pop(path, None)
+
+# Updates a single entry in the index; callers changing many entries should use one IndexSession instead
 def update_index_entry(repo_root, path, hash_val, mtime=0, size=0):
-    index = read_index(repo_root)
-    index[path] = (hash_val, mtime, size)
-    write_index(repo_root, index)
+    with IndexSession(repo_root) as session:
+        session.set(path, hash_val, mtime, size)
 
 # Removes a single entry from the index
 def remove_index_entry(repo_root, path):
@@ -4,34 +4,171 @@
 # It now explicitly builds and reads a Merkle Tree to represent the project's file structure, using recursion to do so
 
 import os
+import io
+import shutil
 import hashlib
 import zlib
+import mmap
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from .repository import temp_path
+from .parallel import parallel_map
+
+# Open object-database transaction, if any: {'repo_root', 'tmp_dir', 'staged': {sha1: tmp_path}}
+_ODB_TRANSACTION = None
+_ODB_LOCK = threading.Lock() # Lets concurrent writers claim a staged object exactly once
+
+# Decompressed objects, least recently used first: {(repo_root, sha1): (type, content)}, bounded by total content size
+_OBJECT_CACHE = OrderedDict()
+_OBJECT_CACHE_LIMIT = 256 * 1024 * 1024
+_object_cache_size = 0
+_OBJECT_CACHE_LOCK = threading.Lock()
+
+# Objects this process has already seen in the object store: {(repo_root, sha1)}. Nothing deletes loose objects, so entries stay valid
+_WRITTEN_OBJECTS = set()
+
+# Object shard directories (objects/xx) known to exist, so each is created or checked at most once per process
+_OBJECT_DIRS = set()
+
+def _ensure_object_dir(object_dir):
+    if object_dir not in _OBJECT_DIRS:
+        os.makedirs(object_dir, exist_ok=True)
+        _OBJECT_DIRS.add(object_dir)
+
+def begin_odb_transaction(repo_root): # Stages new loose objects in a temp dir until end_odb_transaction moves them into place
+    global _ODB_TRANSACTION
+    if _ODB_TRANSACTION is not None:
+        return
+    tmp_dir = os.path.join(repo_root, '.pit', 'objects', f'tmp_objdir-{os.getpid()}')
+    os.makedirs(tmp_dir, exist_ok=True)
+    _ODB_TRANSACTION = {'repo_root': repo_root, 'tmp_dir': tmp_dir, 'staged': {}}
+
+def _fsync_path(path, directory=False): # Flushes a file, or a directory's entries, to disk
+    if directory and os.name == 'nt':
+        return # Windows can't open a directory for fsync; its renames are journaled by NTFS
+    fd = os.open(path, os.O_RDONLY | (getattr(os, 'O_DIRECTORY', 0) if directory else getattr(os, 'O_BINARY', 0)))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def end_odb_transaction(): # Flushes the staged objects, renames them into the object store, then flushes the renames
+    global _ODB_TRANSACTION
+    transaction = _ODB_TRANSACTION
+    if transaction is None:
+        return
+    _ODB_TRANSACTION = None
+    
+    # Only this transaction's files and the shard directories they land in are synced, not the whole host
+    for tmp_path in transaction['staged'].values():
+        _fsync_path(tmp_path)
+    object_dirs = set()
+    for sha1, tmp_path in transaction['staged'].items():
+        object_dir = os.path.join(transaction['repo_root'], '.pit', 'objects', sha1[:2])
+        _ensure_object_dir(object_dir)
+        os.replace(tmp_path, os.path.join(object_dir, sha1[2:]))
+        _WRITTEN_OBJECTS.add((transaction['repo_root'], sha1))
+        object_dirs.add(object_dir)
+    for object_dir in object_dirs:
+        _fsync_path(object_dir, directory=True)
+    try:
+        os.rmdir(transaction['tmp_dir'])
+    except OSError:
+        pass
+
+def abort_odb_transaction(): # Drops every object staged by the open transaction; nothing is moved into the object store
+    global _ODB_TRANSACTION
+    transaction = _ODB_TRANSACTION
+    if transaction is None:
+        return
+    _ODB_TRANSACTION = None
+    shutil.rmtree(transaction['tmp_dir'], ignore_errors=True)
+
+def _object_path(repo_root, sha1): # Where an object lives, looking at objects staged by an open transaction first
+    if _ODB_TRANSACTION is not None and sha1 in _ODB_TRANSACTION['staged']:
+        return _ODB_TRANSACTION['staged'][sha1]
+    return os.path.join(repo_root, '.pit', 'objects', sha1[:2], sha1[2:])
 
 def hash_object(repo_root, content, obj_type, write=True): #Hashes content and optionally writes it as an object of the given type ('blob', 'tree', 'commit')
     header = f'{obj_type} {len(content)}\0'.encode()
-    data = header + content
     
-    sha1 = hashlib.sha1(data).hexdigest()
+    # Hash and compress header and content in turn, never building header + content as one copy
+    sha1_hash = hashlib.sha1(header, usedforsecurity=False) # Content addressing, not security: stays available under FIPS-restricted OpenSSL builds
+    sha1_hash.update(content)
+    sha1 = sha1_hash.hexdigest()
     
     if write:
-        object_dir = os.path.join(repo_root, '.pit', 'objects', sha1[:2])
-        os.makedirs(object_dir, exist_ok=True)
-        object_path = os.path.join(object_dir, sha1[2:])
-        
-        with open(object_path, 'wb') as f:
-            f.write(zlib.compress(data))
+        if (repo_root, sha1) in _WRITTEN_OBJECTS or os.path.exists(os.path.join(repo_root, '.pit', 'objects', sha1[:2], sha1[2:])):
+            _WRITTEN_OBJECTS.add((repo_root, sha1))
+            return sha1 # Content-addressed, so an existing object already holds these bytes; neither staged nor rewritten
+        if _ODB_TRANSACTION is not None and _ODB_TRANSACTION['repo_root'] == repo_root:
+            with _ODB_LOCK:
+                if sha1 in _ODB_TRANSACTION['staged']:
+                    return sha1 # Already staged (possibly by another thread) in this transaction
+                object_path = os.path.join(_ODB_TRANSACTION['tmp_dir'], sha1)
+                _ODB_TRANSACTION['staged'][sha1] = object_path
+            _write_compressed(object_path, header, content) # The staging dir is private until end_odb_transaction renames
+        else:
+            object_dir = os.path.join(repo_root, '.pit', 'objects', sha1[:2])
+            object_path = os.path.join(object_dir, sha1[2:])
+            _ensure_object_dir(object_dir)
+            # Write beside the object and rename it into place, so readers never see a partial object
+            tmp_path = temp_path(object_path)
+            _write_compressed(tmp_path, header, content)
+            os.replace(tmp_path, object_path)
+            _WRITTEN_OBJECTS.add((repo_root, sha1))
             
     return sha1
 
+def _write_compressed(path, header, content): # Deflates at level 1 (Git's loose-object default), header then content in 1MB slices
+    compressor = zlib.compressobj(1)
+    with open(path, 'wb') as f, memoryview(content) as view:
+        f.write(compressor.compress(header))
+        for start in range(0, len(view), 1024 * 1024):
+            f.write(compressor.compress(view[start:start + 1024 * 1024]))
+        f.write(compressor.flush())
+
+def hash_file_object(repo_root, file_path): # hash_object(repo_root, <file contents>, 'blob'); files over 64KB are memory-mapped instead of read into one bytes object
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= 64 * 1024:
+            return hash_object(repo_root, f.read(), 'blob') # Small (or empty, which can't be mapped): a plain read is cheaper
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hash_object(repo_root, mapped, 'blob')
+
+def hash_many(repo_root, file_paths): # Stores each file as a blob on a thread pool; returns [(file_path, sha1, error)] in input order, error being None or the exception
+    def store(file_path):
+        try:
+            return file_path, hash_file_object(repo_root, file_path), None
+        except Exception as e:
+            return file_path, None, e
+    
+    return parallel_map(store, file_paths)
+
+def hash_file(file_path): # Blob id of a file on disk without storing it, streamed through SHA-1 in 64KB chunks
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        sha1 = hashlib.sha1(b'blob %d\0' % size, usedforsecurity=False)
+        while chunk := f.read(64 * 1024):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
 def read_object(repo_root, sha1): #Reads an object by its SHA-1 hash and returns its type and content
+    global _object_cache_size
+    key = (repo_root, sha1)
+    with _OBJECT_CACHE_LOCK:
+        cached = _OBJECT_CACHE.get(key)
+        if cached is not None:
+            _OBJECT_CACHE.move_to_end(key)
+            return cached
     
-    object_path = os.path.join(repo_root, '.pit', 'objects', sha1[:2], sha1[2:])
+    object_path = _object_path(repo_root, sha1)
     
-    if not os.path.exists(object_path):
-        raise FileNotFoundError(f"Object not found: {sha1}")
-        
-    with open(object_path, 'rb') as f:
-        compressed_data = f.read()
+    try: # Opening is the existence check; no separate stat
+        with open(object_path, 'rb') as f:
+            compressed_data = f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Object not found: {sha1}") from None
         
     data = zlib.decompress(compressed_data)
     
@@ -41,8 +178,89 @@ def read_object(repo_root, sha1): #Reads an object by its SHA-1 hash and returns
     
     obj_type, _ = header.split(' ')
     
+    # Objects are immutable, so cache them; evict least recently used entries past the size limit
+    if len(content) <= _OBJECT_CACHE_LIMIT:
+        with _OBJECT_CACHE_LOCK:
+            if key not in _OBJECT_CACHE:
+                _OBJECT_CACHE[key] = (obj_type, content)
+                _object_cache_size += len(content)
+                while _object_cache_size > _OBJECT_CACHE_LIMIT:
+                    _, (_, evicted) = _OBJECT_CACHE.popitem(last=False)
+                    _object_cache_size -= len(evicted)
+    
     return obj_type, content
 
+def peek_type(repo_root, sha1): # Returns only the object's type, inflating just enough bytes to read the header
+    object_path = _object_path(repo_root, sha1)
+    
+    try:
+        f = open(object_path, 'rb')
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Object not found: {sha1}") from None
+    
+    decompressor = zlib.decompressobj()
+    header = b''
+    with f:
+        while b' ' not in header:
+            chunk = f.read(64)
+            if not chunk and not decompressor.unconsumed_tail:
+                break
+            header += decompressor.decompress(decompressor.unconsumed_tail + chunk, 32)
+    
+    return header.split(b' ', 1)[0].decode()
+
+class _ObjectStream: # Read-only file-like over an object's content, inflating the stored file a chunk at a time
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, object_path):
+        self._file = open(object_path, 'rb')
+        self._decompressor = zlib.decompressobj()
+        self._buffer = b''
+        self._eof = False
+        # Inflate just past the "<type> <size>\0" header so reads start at the content
+        while b'\0' not in self._buffer and not self._eof:
+            self._fill()
+        header, _, self._buffer = self._buffer.partition(b'\0')
+        self.type = header.split(b' ', 1)[0].decode()
+
+    def _fill(self): # Inflates at most CHUNK_SIZE more bytes into the buffer
+        data = self._decompressor.unconsumed_tail or self._file.read(self.CHUNK_SIZE)
+        if data:
+            self._buffer += self._decompressor.decompress(data, self.CHUNK_SIZE)
+        else:
+            self._buffer += self._decompressor.flush()
+            self._eof = True
+
+    def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_object_stream(repo_root, sha1): # Opens an object's content as a file-like (with a .type attribute) without inflating it all in memory
+    with _OBJECT_CACHE_LOCK:
+        cached = _OBJECT_CACHE.get((repo_root, sha1))
+    if cached is not None:
+        stream = io.BytesIO(cached[1])
+        stream.type = cached[0]
+        return stream
+
+    try:
+        return _ObjectStream(_object_path(repo_root, sha1))
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Object not found: {sha1}") from None
+
 def build_tree_from_index(repo_root): # Builds a nested dictionary representing the tree structure from the index file
     index_files = read_index(repo_root)
     return build_tree_from_dict(index_files)
@@ -50,16 +268,20 @@ def build_tree_from_index(repo_root): # Builds a nested dictionary representing
 # Builds a nested dictionary representing the tree structure from a dict of {path: hash}.
 def build_tree_from_dict(files_dict):
     tree = {}
+    levels = {'': tree} # Directory path -> its nested dict, so files after the first in a directory skip the walk from the root
     for path, hash_val in files_dict.items():
         # Handle cases where hash might be a tuple (hash, mtime, size)
         if isinstance(hash_val, tuple):
             hash_val = hash_val[0]
             
-        parts = path.split(os.sep)
-        current_level = tree
-        for part in parts[:-1]:
-            current_level = current_level.setdefault(part, {})
-        current_level[parts[-1]] = hash_val
+        dir_path, _, name = path.rpartition(os.sep)
+        current_level = levels.get(dir_path)
+        if current_level is None:
+            current_level = tree
+            for part in dir_path.split(os.sep):
+                current_level = current_level.setdefault(part, {})
+            levels[dir_path] = current_level
+        current_level[name] = hash_val
     return tree
 
 # Reads the index file and returns a dictionary {path: (hash, mtime, size)}.
@@ -84,27 +306,33 @@ def read_index(repo_root):
                     index_files[path] = (hash_val, 0, 0)
     return index_files
 
-def write_tree(repo_root, tree_dict): #Recursively writes a tree object from a nested dictionary and returns its hash
+# Recursively writes a tree object from a nested dictionary and returns its hash.
+# subtree_cache, if given, maps a tree's (name, type, hash) children to its hash; callers writing several similar trees
+# share one so an identical subtree is serialized, hashed and written only once
+def write_tree(repo_root, tree_dict, subtree_cache=None):
 
-    entries = []
+    children = []
     for name, value in sorted(tree_dict.items()):
         if isinstance(value, dict):
             # It's a subdirectory, recurse
-            subtree_hash = write_tree(repo_root, value)
-            mode = '040000'  # Directory mode
-            entry_type = 'tree'
-            sha1 = subtree_hash
+            children.append((name, 'tree', write_tree(repo_root, value, subtree_cache)))
         else:
             # It's a file blob
-            mode = '100644'  # Regular file mode
-            entry_type = 'blob'
-            sha1 = value
-        
-        # Format is: <mode> <type> <hash>\t<name>
-        entries.append(f"{mode} {entry_type} {sha1}\t{name}".encode())
+            children.append((name, 'blob', value))
+    
+    key = tuple(children)
+    if subtree_cache is not None and key in subtree_cache:
+        return subtree_cache[key]
+    
+    # Format is: <mode> <type> <hash>\t<name>
+    entries = [f"{'040000' if entry_type == 'tree' else '100644'} {entry_type} {sha1}\t{name}".encode()
+               for name, entry_type, sha1 in children]
 
     tree_content = b'\n'.join(entries)
-    return hash_object(repo_root, tree_content, 'tree')
+    tree_hash = hash_object(repo_root, tree_content, 'tree')
+    if subtree_cache is not None:
+        subtree_cache[key] = tree_hash
+    return tree_hash
 
 def get_commit_tree_hash(repo_root, commit_hash): # Retrieves the tree hash from a commit object
     if not commit_hash:
@@ -129,20 +357,64 @@ def get_commit_files(repo_root, commit_hash): #Retrieves all files and their has
     
     files = {}
     
-    def read_tree_recursive(tree_sha, path_prefix=""):
+    def tree_entries(tree_sha, path_prefix): # Yields (type, hash, path) per entry, parsing the tree as bytes
         obj_type, content = read_object(repo_root, tree_sha)
         if obj_type != 'tree':
             raise TypeError(f"Object {tree_sha} is not a tree")
         
-        for line in content.decode().splitlines():
+        for line in content.split(b'\n'):
+            if not line:
+                continue
             # Line format: <mode> <type> <hash>\t<name>
-            _, entry_type, sha1, name = line.replace('\t', ' ').split(' ', 3)
-            current_path = os.path.join(path_prefix, name)
-            
-            if entry_type == 'blob':
+            meta, _, name = line.partition(b'\t')
+            _, entry_type, sha1 = meta.split(b' ', 2)
+            yield entry_type, sha1.decode(), os.path.join(path_prefix, name.decode())
+
+    # Depth-first with an explicit stack of entry iterators instead of recursion; a subtree is
+    # walked as soon as it is reached, so files come out in the same order as before
+    stack = [tree_entries(tree_hash, "")]
+    while stack:
+        for entry_type, sha1, current_path in stack[-1]:
+            if entry_type == b'blob':
                 files[current_path] = sha1
-            elif entry_type == 'tree':
-                read_tree_recursive(sha1, current_path)
+            elif entry_type == b'tree':
+                stack.append(tree_entries(sha1, current_path))
+                break
+        else:
+            stack.pop()
+    return files
+
+# Commits are immutable, so a commit's flattened file map can be memoized by hash
+@lru_cache(maxsize=32)
+def _cached_commit_files(repo_root, commit_hash):
+    return get_commit_files(repo_root, commit_hash)
 
-    read_tree_recursive(tree_hash)
-    return files
\ No newline at end of file
+def get_commit_tree_map(repo_root, commit_hash): # Cached get_commit_files; returns a copy so callers may mutate it freely
+    if not commit_hash:
+        return {}
+    return dict(_cached_commit_files(repo_root, commit_hash))
+
+# get_commit_files backed by a one-entry flat listing in .pit/commit-files ("<commit>" line, then "<hash> <path>" lines), so
+# repeated runs against the same commit (typically HEAD across status calls) read one file instead of walking every tree object
+def get_commit_files_cached(repo_root, commit_hash):
+    if not commit_hash:
+        return {}
+    cache_path = os.path.join(repo_root, '.pit', 'commit-files')
+    try:
+        with open(cache_path, 'r') as f:
+            if f.readline().rstrip('\n') == commit_hash: # Commits are immutable, so the hash alone validates the listing
+                return {path: sha1 for sha1, path in (line.rstrip('\n').split(' ', 1) for line in f)}
+    except (OSError, ValueError):
+        pass
+    
+    files = get_commit_files(repo_root, commit_hash)
+    if any('\n' in path or '\r' in path for path in files):
+        return files # A line-based listing can't hold such a path, so this commit is just never cached
+    try:
+        tmp_path = temp_path(cache_path) # Private per writer, so concurrent runs don't clobber each other's file
+        with open(tmp_path, 'w') as f:
+            f.write(''.join([f"{commit_hash}\n"] + [f"{sha1} {path}\n" for path, sha1 in files.items()]))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass # The listing is only a cache
+    return files
@@ -0,0 +1,26 @@
+# What it does: Runs per-file jobs (reading, hashing, compressing) on a thread pool shared by add, status and stash
+# How it does: File reads, SHA-1 and zlib release the GIL, so threads overlap disk waits with hashing. Every pool is sized by one rule, and at most one job runs inline without a pool
+# What data structure it uses: List (of jobs, and of results in input order)
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def _workers(job_count): # ThreadPoolExecutor's own default, capped at the number of jobs
+    return min(32, (os.cpu_count() or 1) + 4, job_count)
+
+def parallel_map(func, jobs): # Returns [func(job) for job in jobs], in input order, computed on a thread pool
+    if len(jobs) <= 1:
+        return [func(job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=_workers(len(jobs))) as pool:
+        return list(pool.map(func, jobs))
+
+def parallel_any(predicate, jobs): # Returns any(predicate(job) for job in jobs); jobs not yet started are dropped once one is true
+    if len(jobs) <= 1:
+        return any(predicate(job) for job in jobs)
+    with ThreadPoolExecutor(max_workers=_workers(len(jobs))) as pool:
+        futures = [pool.submit(predicate, job) for job in jobs]
+        for future in as_completed(futures):
+            if future.result():
+                pool.shutdown(wait=False, cancel_futures=True) # Drop queued jobs, the answer is known
+                return True
+    return False
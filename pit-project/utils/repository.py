@@ -1,76 +1,118 @@
 # What it does: Provides high-level functions for interacting with the repository structure, like finding the repo root and managing branch pointers
 # How it does: It reads/writes to files like `HEAD` and those in `refs/heads` to manage the repository's current state and branch locations. `find_repo_root` walks up the directory tree to locate the `.pit` directory
-# What data structure it uses: Uses recursion (specifically, linear recursion) to find the repo root. Conceptually, it manages pointers (the `HEAD` file and branch files), which are fundamental components of data structures like Graphs and Linked Lists
+# What data structure it uses: Uses iteration (a loop up the parent directories) to find the repo root. Conceptually, it manages pointers (the `HEAD` file and branch files), which are fundamental components of data structures like Graphs and Linked Lists
 
 import os
 import sys
+import locale
+import threading
 
-def find_repo_root(path='.'): # Recursively searches for the .pit directory to find the repository root
+# Repository roots already found, keyed by the absolute start path. Only hits are kept, so a root created later by `pit init` is still found
+_REPO_ROOT_CACHE = {}
+
+def find_repo_root(path='.'): # Finds the repository root at or above path; a cached answer costs one isdir check instead of a walk
     path = os.path.abspath(path)
-    pit_dir = os.path.join(path, '.pit')
-    if os.path.isdir(pit_dir):
-        return path
-    parent_path = os.path.dirname(path)
-    if parent_path == path:
-        return None
-    return find_repo_root(parent_path)
+    root = _REPO_ROOT_CACHE.get(path)
+    if root is not None and os.path.isdir(os.path.join(root, '.pit')):
+        return root
+    root = _search_repo_root(path)
+    if root is not None:
+        _REPO_ROOT_CACHE[path] = root
+    return root
 
-def get_head_commit(repo_root): # Retrieves the commit hash that HEAD points to, or None if there are no commits
-    head_path = os.path.join(repo_root, '.pit', 'HEAD')
-    if not os.path.exists(head_path):
-        return None
-    with open(head_path, 'r') as f:
-        head_content = f.read().strip()
+def invalidate_repo_root_cache(): # For when a new .pit may now sit between a start path and its cached root
+    _REPO_ROOT_CACHE.clear()
+
+def _search_repo_root(path): # Walks up from path, one parent per iteration, looking for the .pit directory
+    while True:
+        if os.path.isdir(os.path.join(path, '.pit')):
+            return path
+        parent_path = os.path.dirname(path)
+        if parent_path == path:
+            return None # Reached the filesystem root
+        path = parent_path
+
+def temp_path(path): # A temp name next to path that is private to this process and thread, so concurrent writers never share one
+    return f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+
+def atomic_write(path, data): # Writes text to a temp file and renames it over path, so readers never see a half-written file
+    tmp_path = temp_path(path)
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+# The encoding open() uses for text files by default, so raw reads decode refs exactly as they were written
+_TEXT_ENCODING = locale.getpreferredencoding(False)
+
+def _read_small(path): # Stripped text of a small file (HEAD or a ref) via one os.read, skipping the buffered text-file layers
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        return os.read(fd, 4096).decode(_TEXT_ENCODING).strip()
+    finally:
+        os.close(fd)
+
+def _read_head(repo_root): # The stripped contents of HEAD ('ref: ...' or a commit hash)
+    return _read_small(os.path.join(repo_root, '.pit', 'HEAD'))
+
+def get_head_commit(repo_root, head_content=None): # Retrieves the commit hash that HEAD points to, or None if there are no commits. head_content skips re-reading HEAD
+    if head_content is None:
+        try: # Opening is the existence check; no separate stat
+            head_content = _read_head(repo_root)
+        except FileNotFoundError:
+            return None
     if head_content.startswith('ref: '):
         ref_path = head_content.split(' ', 1)[1]
         # Convert forward slashes to OS-specific separator for file path
         ref_path_normalized = ref_path.replace('/', os.sep)
         branch_path = os.path.join(repo_root, '.pit', ref_path_normalized)
-        if not os.path.exists(branch_path) or os.path.getsize(branch_path) == 0:
+        try:
+            return _read_small(branch_path) or None # An empty branch file means no commits yet
+        except FileNotFoundError:
             return None
-        with open(branch_path, 'r') as f:
-            return f.read().strip()
     else:
         return head_content.strip()
 
-def get_current_branch(repo_root): # Retrieves the name of the current branch HEAD points to, or None if in detached HEAD state
-    head_path = os.path.join(repo_root, '.pit', 'HEAD')
-    with open(head_path, 'r') as f:
-        head_content = f.read().strip()
+def get_current_branch(repo_root, head_content=None): # Retrieves the name of the current branch HEAD points to, or None if in detached HEAD state
+    if head_content is None:
+        head_content = _read_head(repo_root)
     if head_content.startswith('ref: refs/heads/'):
         return head_content.split('/')[-1].strip()
     return None
 
 def get_all_branches(repo_root): # Lists all branch names by reading the refs/heads directory
     branches_dir = os.path.join(repo_root, '.pit', 'refs', 'heads')
-    if not os.path.isdir(branches_dir):
+    try: # listdir already fails on a missing directory, so no isdir probe first
+        return os.listdir(branches_dir)
+    except (FileNotFoundError, NotADirectoryError):
         return []
-    return [name for name in os.listdir(branches_dir)]
 
 def create_branch(repo_root, branch_name, commit_hash): # Creates a new branch pointing to the given commit hash
     if not commit_hash:
         print("fatal: Not a valid object name: 'HEAD'. Cannot create branch.", file=sys.stderr)
         sys.exit(1)
     branch_path = os.path.join(repo_root, '.pit', 'refs', 'heads', branch_name)
-    if os.path.exists(branch_path):
+    try: # Exclusive create: the existence check and the open are one call, with no window for a racing creator
+        with open(branch_path, 'x') as f:
+            f.write(f"{commit_hash}\n")
+    except FileExistsError:
         print(f"fatal: A branch named '{branch_name}' already exists.", file=sys.stderr)
         sys.exit(1)
-    with open(branch_path, 'w') as f:
-        f.write(f"{commit_hash}\n")
 
 def get_branch_commit(repo_root, branch_name): # Retrieves the commit hash that a given branch points to, or None if the branch doesn't exist
     branch_path = os.path.join(repo_root, '.pit', 'refs', 'heads', branch_name)
-    if not os.path.exists(branch_path):
+    try:
+        with open(branch_path, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
         return None
-    with open(branch_path, 'r') as f:
-        return f.read().strip()
 
 def get_head_status(repo_root): # Returns a user-friendly string describing HEAD state
-    current_branch = get_current_branch(repo_root)
+    head_content = _read_head(repo_root) # Read once and shared by both lookups below
+    current_branch = get_current_branch(repo_root, head_content)
     if current_branch:
         return f"On branch {current_branch}"
     else:
-        head_commit = get_head_commit(repo_root)
+        head_commit = get_head_commit(repo_root, head_content)
         if head_commit:
             return f"HEAD detached at {head_commit[:7]}"
         else:
@@ -0,0 +1,37 @@
+# What it does: Walks the working directory, yielding every non-ignored file outside .pit
+# How it does: Keeps a stack of directories and reads each with `os.scandir`, so file type checks come from the directory listing and `DirEntry.stat()` is cached per entry. Ignored directories are pruned before descent
+# What data structure it uses: Stack (of directories still to visit), Generator (paths are produced lazily as they are found)
+
+import os
+from utils import ignore
+
+def iter_working_files(repo_root, ignore_patterns): # Yields (rel_path, DirEntry) for each non-ignored file, like os.walk + relpath
+    # Compile once for the whole walk; with no patterns at all, skip matching entirely
+    match = ignore.compile_patterns(ignore_patterns).match if ignore_patterns else None
+    match_dir = ignore.compile_dir_patterns(ignore_patterns).match if ignore_patterns else None
+    join, scandir, sep = os.path.join, os.scandir, os.sep # Bound once; these run for every entry
+    stack = [(repo_root, '')]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        try:
+            entries = list(scandir(dir_path))
+        except OSError:
+            continue # Unreadable or vanished directory, as os.walk would skip it
+
+        for entry in entries:
+            rel_path = join(rel_dir, entry.name) if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+
+            if is_dir:
+                # A directory whose name matches a pattern makes every path below it ignored, so don't descend.
+                # So does one whose path plus '/' matches a trailing-'*' pattern ('build/*'); anything is_ignored() would
+                # still let through ('src/gen/' never matches a file) is walked. Symlinked directories are not followed (os.walk's default)
+                if entry.name == '.pit' or entry.is_symlink() or (match and (match(entry.name) or match_dir(rel_path.replace(sep, '/') + '/'))):
+                    continue
+                stack.append((entry.path, rel_path))
+            # Every parent directory name was already checked on the way down, so only the full path and the file's own name are left
+            elif not match or not (match(entry.name) or match(rel_path.replace(sep, '/'))):
+                yield rel_path, entry
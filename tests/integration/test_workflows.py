@@ -4,11 +4,12 @@ import pytest
 import os
 import sys
 import subprocess
+import argparse
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'pit-project'))
 
 from utils import repository, objects, index as index_utils
-from commands import init, add, commit, status, branch, checkout, merge, log, stash, reset, clean
+from commands import init, add, commit, status, branch, checkout, merge, log, stash, reset, clean, rebase
 
 
 class TestBasicWorkflow:
@@ -51,6 +52,59 @@ class TestBasicWorkflow:
         assert 'test.txt' in result
         assert result['test.txt'][0] == blob_hash
     
+    def test_skips_rehash_when_mtime_matches(self, temp_repo):
+        # pit add should keep the staged hash of a file whose stat data still matches, unless the entry is racy
+        repo_root = repository.find_repo_root()
+        file_path = os.path.join(repo_root, 'test.txt')
+        with open(file_path, 'w') as f:
+            f.write('test content')
+        stats = os.stat(file_path)
+        index_path = os.path.join(repo_root, '.pit', 'index')
+        args = argparse.Namespace(files=['test.txt'], all=False)
+        
+        # Index written well after the file changed: the recorded hash is trusted without reading the file
+        index_utils.write_index(repo_root, {'test.txt': ('cachedhash', stats.st_mtime_ns, stats.st_size)})
+        os.utime(index_path, ns=(stats.st_mtime_ns + 10**9, stats.st_mtime_ns + 10**9))
+        add.run(args)
+        assert index_utils.read_index(repo_root)['test.txt'][0] == 'cachedhash'
+        
+        # Index not newer than the file: the entry may predate a same-tick write, so the file is hashed again
+        os.utime(index_path, ns=(stats.st_mtime_ns, stats.st_mtime_ns))
+        add.run(args)
+        assert index_utils.read_index(repo_root)['test.txt'][0] == objects.hash_file(file_path)
+    
+    def test_status_rehashes_racy_entries(self, temp_repo, capsys):
+        # pit status should not trust, or write back, stat data for a file modified in the same tick as the index
+        repo_root = repository.find_repo_root()
+        file_path = os.path.join(repo_root, 'test.txt')
+        with open(file_path, 'w') as f:
+            f.write('edited in the same tick')
+        stats = os.stat(file_path)
+        index_path = os.path.join(repo_root, '.pit', 'index')
+        
+        # The entry's stat data matches the file, but the index is no newer than the file, so its hash is suspect
+        index_utils.write_index(repo_root, {'test.txt': ('stalehash', stats.st_mtime_ns, stats.st_size)})
+        os.utime(index_path, ns=(stats.st_mtime_ns, stats.st_mtime_ns))
+        status.run(argparse.Namespace())
+        
+        assert 'modified:   test.txt' in capsys.readouterr().out
+        assert index_utils.read_index(repo_root)['test.txt'] == ('stalehash', stats.st_mtime_ns, stats.st_size)
+    
+    def test_status_sees_tracked_file_under_dir_pattern(self, temp_repo, capsys):
+        # A 'src/gen/' pattern doesn't ignore src/gen/x.py, so the walk must still find it rather than report it deleted
+        os.makedirs(os.path.join(temp_repo, 'src', 'gen'))
+        with open(os.path.join(temp_repo, 'src', 'gen', 'x.py'), 'w') as f:
+            f.write('x = 1\n')
+        with open(os.path.join(temp_repo, '.pitignore'), 'w') as f:
+            f.write('src/gen/\n')
+        add.run(argparse.Namespace(files=['.'], all=False))
+        commit.run(argparse.Namespace(message='track generated file'))
+        capsys.readouterr()
+        
+        status.run(argparse.Namespace())
+        
+        assert 'x.py' not in capsys.readouterr().out
+    
     def test_commit_creates_objects(self, temp_repo):
         # pit commit should create tree and commit objects
         # Setup: add a file
@@ -121,6 +175,39 @@ class TestMergeWorkflow:
         assert master_commit == feature_commit == initial_commit
 
 
+
+class TestRebaseWorkflow:
+    # Tests for collecting the commits a rebase replays
+    
+    def _chain(self, repo_root, parent, names): # Writes one single-parent commit per name on top of parent; returns their hashes
+        hashes = []
+        for name in names:
+            parent_line = f"parent {parent}\n" if parent else ""
+            parent = objects.hash_object(repo_root, f"tree 0\n{parent_line}\n{name}\n".encode(), 'commit')
+            hashes.append(parent)
+        return hashes
+    
+    def test_diverged_lines_stop_at_merge_base(self, temp_repo, monkeypatch):
+        # Only the branch's own commits are replayed, and the walk never goes below the merge base
+        shared = self._chain(temp_repo, None, ['root', 'c1', 'c2', 'base'])
+        feature = self._chain(temp_repo, shared[-1], ['f1', 'f2'])
+        upstream = self._chain(temp_repo, shared[-1], ['u1', 'u2', 'u3'])
+        visited = []
+        get_parents = rebase._get_parents
+        monkeypatch.setattr(rebase, '_get_parents', lambda repo_root, c: visited.append(c) or get_parents(repo_root, c))
+        
+        assert rebase._collect_commits_to_replay(temp_repo, feature[-1], upstream[-1]) == feature
+        assert shared[0] not in visited
+    
+    def test_upstream_merge_still_finds_chain(self, temp_repo):
+        # A merge commit on upstream's side must not hide that the branch sits straight on top of it
+        base = self._chain(temp_repo, None, ['root'])[0]
+        side = self._chain(temp_repo, None, ['side'])[0]
+        merge_commit = objects.hash_object(temp_repo, f"tree 0\nparent {base}\nparent {side}\n\nmerge\n".encode(), 'commit')
+        feature = self._chain(temp_repo, merge_commit, ['f1', 'f2'])
+        
+        assert rebase._collect_commits_to_replay(temp_repo, feature[-1], merge_commit) == feature
+
 class TestStashWorkflow:
     # Tests for stash operations
     
@@ -176,3 +263,13 @@ class TestResetWorkflow:
         result = index_utils.read_index(temp_repo)
         assert 'file1.txt' not in result
         assert 'file2.txt' in result
+    
+    def test_reset_command_keeps_other_entries(self, temp_repo, capsys):
+        # pit reset should drop only the named entries, keep the others' stat data, and leave no temp file behind
+        index_utils.write_index(temp_repo, {'file1.txt': ('hash1', 1, 2), 'file2.txt': ('hash2', 3, 4)})
+        
+        reset.run(argparse.Namespace(files=['file1.txt', 'missing.txt']))
+        
+        assert index_utils.read_index(temp_repo) == {'file2.txt': ('hash2', 3, 4)}
+        assert capsys.readouterr().out == "Unstaged changes after reset:\n M file1.txt\n"
+        assert not [name for name in os.listdir(os.path.join(temp_repo, '.pit')) if name.endswith('.tmp')]
@@ -0,0 +1,27 @@
+# Unit tests for utils/config.py
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'pit-project'))
+
+from utils import config
+
+
+class TestReadConfig:
+    # Tests for config.read_config()
+
+    def test_reads_user_identity(self, temp_repo):
+        # Should return the [user] section written by the fixture as plain dict lookups
+        assert config.get_user_config(temp_repo) == ('Test User', 'test@example.com')
+
+    def test_reads_back_written_values(self, temp_repo):
+        # Values written through configparser, including '=' and a multi-line value, should read back unchanged
+        config.write_config('alias.co', 'checkout')
+        config.write_config('merge.tool', 'vim -d a=b\nsecond line')
+
+        cfg = config.read_config()
+
+        assert cfg['alias']['co'] == 'checkout'
+        assert cfg['merge']['tool'] == 'vim -d a=b\nsecond line'
@@ -31,6 +31,24 @@ class TestReadIndex:
         assert 'src/main.py' in result
         assert result['src/main.py'] == ('def456', 9876543210, 200)
 
+    def test_path_with_spaces(self, temp_repo):
+        # Everything after the third field is the path, including its spaces
+        index_path = os.path.join(temp_repo, '.pit', 'index')
+        with open(index_path, 'w') as f:
+            f.write("abc123 1 2 my  notes.txt\n")
+
+        result = index_utils.read_index(temp_repo)
+
+        assert result == {'my  notes.txt': ('abc123', 1, 2)}
+
+    def test_path_with_line_separator_characters(self, temp_repo):
+        # Characters splitlines() treats as line breaks (form feed, file separator) are part of the path
+        index_utils.write_index(temp_repo, {'a\x0cb.txt': ('abc123', 1, 2), 'c\x1cd.txt': ('def456', 3, 4)})
+
+        result = index_utils.read_index(temp_repo)
+
+        assert result == {'a\x0cb.txt': ('abc123', 1, 2), 'c\x1cd.txt': ('def456', 3, 4)}
+
 
 class TestReadIndexHashes:
     # Tests for index_utils.read_index_hashes()
@@ -45,6 +63,12 @@ class TestReadIndexHashes:
         
         assert result == {'test.txt': 'abc123'}
 
+    def test_path_with_line_separator_characters(self, temp_repo):
+        # Should keep a form feed in the path, like read_index
+        index_utils.write_index(temp_repo, {'a\x0cb.txt': ('abc123', 1, 2)})
+
+        assert index_utils.read_index_hashes(temp_repo) == {'a\x0cb.txt': 'abc123'}
+
 
 class TestWriteIndex:
     # Tests for index_utils.write_index()
@@ -84,3 +108,34 @@ class TestWriteIndex:
         assert 'a_first.txt' in lines[0]
         assert 'm_middle.txt' in lines[1]
         assert 'z_last.txt' in lines[2]
+    
+    def test_bare_hash_values(self, temp_repo):
+        # Should accept {path: hash} dicts and write zeroed stat data, leaving no temp file behind
+        index_utils.write_index(temp_repo, {'file.txt': 'hash1'})
+        
+        assert index_utils.read_index(temp_repo) == {'file.txt': ('hash1', 0, 0)}
+        assert not os.path.exists(os.path.join(temp_repo, '.pit', 'index.tmp'))
+
+
+class TestIndexSession:
+    # Tests for index_utils.IndexSession
+    
+    def test_writes_once_on_exit(self, temp_repo):
+        # Edits made in the block should all be in the index afterwards
+        index_utils.write_index(temp_repo, {'old.txt': ('hash0', 0, 0)})
+        
+        with index_utils.IndexSession(temp_repo) as session:
+            session.set('a.txt', 'hash1', 1, 2)
+            session.set('b.txt', 'hash2')
+            session.remove('old.txt')
+        
+        assert index_utils.read_index(temp_repo) == {'a.txt': ('hash1', 1, 2), 'b.txt': ('hash2', 0, 0)}
+    
+    def test_no_write_when_block_raises(self, temp_repo):
+        # A failing block should leave the index as it was
+        with pytest.raises(RuntimeError):
+            with index_utils.IndexSession(temp_repo) as session:
+                session.set('a.txt', 'hash1')
+                raise RuntimeError
+        
+        assert index_utils.read_index(temp_repo) == {}
@@ -0,0 +1,94 @@
+# Unit tests for utils/objects.py
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'pit-project'))
+
+from utils import objects
+
+
+def _make_commit(repo_root, files):
+    # Writes blobs, a tree and a commit for {path: content}; returns (commit_hash, {path: blob_hash})
+    hashes = {path: objects.hash_object(repo_root, content, 'blob') for path, content in files.items()}
+    tree_hash = objects.write_tree(repo_root, objects.build_tree_from_dict(hashes))
+    commit_hash = objects.hash_object(repo_root, f"tree {tree_hash}\n\nmsg\n".encode(), 'commit')
+    return commit_hash, hashes
+
+
+class TestHashFile:
+    # Tests for objects.hash_file()
+
+    def test_matches_hash_object(self, temp_repo):
+        # Streaming a file should give the same id as hashing its content as a blob
+        content = os.urandom(200000)
+        path = os.path.join(temp_repo, 'big.bin')
+        with open(path, 'wb') as f:
+            f.write(content)
+
+        assert objects.hash_file(path) == objects.hash_object(temp_repo, content, 'blob', write=False)
+
+
+class TestHashFileObject:
+    # Tests for objects.hash_file_object()
+
+    def test_stores_same_blob_as_hash_object(self, temp_repo):
+        # A mapped file spanning several compression slices should be stored as the blob hash_object would write
+        content = os.urandom(3 * 1024 * 1024 + 7)
+        path = os.path.join(temp_repo, 'big.bin')
+        with open(path, 'wb') as f:
+            f.write(content)
+
+        sha1 = objects.hash_file_object(temp_repo, path)
+
+        assert sha1 == objects.hash_object(temp_repo, content, 'blob', write=False)
+        assert objects.read_object(temp_repo, sha1) == ('blob', content)
+
+
+class TestGetCommitFilesCached:
+    # Tests for objects.get_commit_files_cached()
+
+    def test_first_and_cached_reads_match(self, temp_repo):
+        # The listing written on the first call should read back as the same {path: hash} map
+        commit_hash, expected = _make_commit(temp_repo, {'a.txt': b'a', os.path.join('src', 'b c.txt'): b'b'})
+
+        assert objects.get_commit_files_cached(temp_repo, commit_hash) == expected
+        assert objects.get_commit_files_cached(temp_repo, commit_hash) == expected
+
+    def test_other_commit_replaces_listing(self, temp_repo):
+        # A different commit hash should not be served the previous commit's files
+        first, _ = _make_commit(temp_repo, {'a.txt': b'a'})
+        second, expected = _make_commit(temp_repo, {'b.txt': b'b'})
+
+        objects.get_commit_files_cached(temp_repo, first)
+        assert objects.get_commit_files_cached(temp_repo, second) == expected
+
+    def test_line_break_in_path_is_not_cached(self, temp_repo):
+        # A path with a carriage return would be split on read, so it should come back from the tree walk instead
+        commit_hash, expected = _make_commit(temp_repo, {'a\rb.txt': b'a', 'c.txt': b'c'})
+
+        assert objects.get_commit_files_cached(temp_repo, commit_hash) == expected
+        assert objects.get_commit_files_cached(temp_repo, commit_hash) == expected
+        assert not os.path.exists(os.path.join(temp_repo, '.pit', 'commit-files'))
+
+
+class TestOdbTransaction:
+    # Tests for objects.begin/end/abort_odb_transaction()
+
+    def test_abort_discards_staged_objects(self, temp_repo):
+        # Objects staged before an abort should never reach the object store
+        objects.begin_odb_transaction(temp_repo)
+        sha1 = objects.hash_object(temp_repo, b'staged', 'blob')
+        objects.abort_odb_transaction()
+
+        assert not os.path.exists(os.path.join(temp_repo, '.pit', 'objects', sha1[:2], sha1[2:]))
+        assert not any(name.startswith('tmp_objdir-') for name in os.listdir(os.path.join(temp_repo, '.pit', 'objects')))
+
+    def test_end_moves_staged_objects(self, temp_repo):
+        # Ending the transaction should make staged objects readable from the store
+        objects.begin_odb_transaction(temp_repo)
+        sha1 = objects.hash_object(temp_repo, b'kept', 'blob')
+        objects.end_odb_transaction()
+
+        assert objects.read_object(temp_repo, sha1) == ('blob', b'kept')
@@ -0,0 +1,30 @@
+# Unit tests for utils/parallel.py
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'pit-project'))
+
+from utils import parallel
+
+
+class TestParallelMap:
+    # Tests for parallel.parallel_map()
+
+    def test_keeps_input_order(self):
+        # Results should line up with the jobs, whether run inline or on the pool
+        assert parallel.parallel_map(lambda n: n * n, []) == []
+        assert parallel.parallel_map(lambda n: n * n, [3]) == [9]
+        assert parallel.parallel_map(lambda n: n * n, list(range(100))) == [n * n for n in range(100)]
+
+
+class TestParallelAny:
+    # Tests for parallel.parallel_any()
+
+    def test_matches_any(self):
+        # Should agree with the built-in any() for no jobs, one job and many
+        assert parallel.parallel_any(bool, []) is False
+        assert parallel.parallel_any(bool, [0]) is False
+        assert parallel.parallel_any(bool, [0] * 50) is False
+        assert parallel.parallel_any(bool, [0] * 49 + [1]) is True
@@ -32,6 +32,42 @@ class TestFindRepoRoot:
         result = repository.find_repo_root(temp_dir)
         assert result is None
 
+    def test_cached_root_dropped_when_repo_removed(self, temp_repo):
+        # A cached answer should not outlive the .pit directory it points at
+        assert repository.find_repo_root(temp_repo) == temp_repo
+        os.rename(os.path.join(temp_repo, '.pit'), os.path.join(temp_repo, 'old-pit'))
+        
+        assert repository.find_repo_root(temp_repo) is None
+
+
+class TestTempPath:
+    # Tests for repository.temp_path()
+    
+    def test_private_per_thread(self, temp_repo):
+        # Two threads writing the same file should never be handed the same temp name
+        import threading
+        path = os.path.join(temp_repo, '.pit', 'index')
+        names = []
+        thread = threading.Thread(target=lambda: names.append(repository.temp_path(path)))
+        thread.start()
+        thread.join()
+        
+        assert names[0] != repository.temp_path(path)
+        assert os.path.dirname(names[0]) == os.path.dirname(path) # Same directory, so os.replace stays a rename
+
+
+class TestAtomicWrite:
+    # Tests for repository.atomic_write()
+    
+    def test_replaces_without_leftovers(self, temp_repo):
+        # Should swap the new text in and leave no temp file beside it
+        path = os.path.join(temp_repo, '.pit', 'HEAD')
+        repository.atomic_write(path, 'ref: refs/heads/dev\n')
+        
+        with open(path) as f:
+            assert f.read() == 'ref: refs/heads/dev\n'
+        assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')]
+
 
 class TestGetHeadCommit:
     # Tests for repository.get_head_commit()
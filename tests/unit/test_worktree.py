@@ -0,0 +1,64 @@
+# Unit tests for utils/worktree.py
+
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'pit-project'))
+
+from utils import worktree, ignore
+
+
+class TestIterWorkingFiles:
+    # Tests for worktree.iter_working_files()
+    
+    def test_yields_relative_paths(self, temp_repo):
+        # Should yield every file with an os.sep-joined path relative to the repo root
+        os.makedirs(os.path.join(temp_repo, 'src', 'deep'))
+        for rel in ('a.txt', os.path.join('src', 'b.txt'), os.path.join('src', 'deep', 'c.txt')):
+            with open(os.path.join(temp_repo, rel), 'w') as f:
+                f.write(rel)
+        
+        patterns = ignore.get_ignored_patterns(temp_repo)
+        result = {rel: entry.path for rel, entry in worktree.iter_working_files(temp_repo, patterns)}
+        
+        assert set(result) == {'a.txt', os.path.join('src', 'b.txt'), os.path.join('src', 'deep', 'c.txt')}
+        assert result['a.txt'] == os.path.join(temp_repo, 'a.txt')
+    
+    def test_skips_pit_and_ignored_dirs(self, temp_repo):
+        # Should never yield anything from .pit or from a directory matching an ignore pattern
+        os.makedirs(os.path.join(temp_repo, 'node_modules', 'pkg'))
+        with open(os.path.join(temp_repo, 'node_modules', 'pkg', 'index.js'), 'w') as f:
+            f.write('x')
+        with open(os.path.join(temp_repo, 'keep.txt'), 'w') as f:
+            f.write('x')
+        with open(os.path.join(temp_repo, '.pitignore'), 'w') as f:
+            f.write('node_modules\n')
+        
+        patterns = ignore.get_ignored_patterns(temp_repo)
+        result = [rel for rel, _ in worktree.iter_working_files(temp_repo, patterns)]
+        
+        assert sorted(result) == ['.pitignore', 'keep.txt']
+    
+    def test_empty_patterns_still_skip_pit(self, temp_repo):
+        # With no ignore patterns every file is yielded, but .pit is still never entered
+        with open(os.path.join(temp_repo, 'a.pyc'), 'w') as f:
+            f.write('x')
+        
+        result = [rel for rel, _ in worktree.iter_working_files(temp_repo, set())]
+        
+        assert result == ['a.pyc']
+    
+    def test_prunes_only_what_is_ignored(self, temp_repo):
+        # 'build/*' ignores everything below build, so it is pruned; 'src/gen/' matches no file path, so src/gen is still walked
+        files = (os.path.join('build', 'o.bin'), os.path.join('src', 'gen', 'x.c'), os.path.join('src', 'main.c'))
+        for rel in files:
+            os.makedirs(os.path.join(temp_repo, os.path.dirname(rel)), exist_ok=True)
+            with open(os.path.join(temp_repo, rel), 'w') as f:
+                f.write('x')
+        patterns = {'build/*', 'src/gen/'}
+        
+        result = [rel for rel, _ in worktree.iter_working_files(temp_repo, patterns)]
+        
+        assert sorted(result) == sorted(rel for rel in files if not ignore.is_ignored(rel, patterns))
+        assert sorted(result) == [os.path.join('src', 'gen', 'x.c'), os.path.join('src', 'main.c')]